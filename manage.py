@@ -10,12 +10,15 @@ LOG = logging.getLogger(__name__)
 EXCHANGE_ACTIONS = dict(erase=store.exchange_erase,
                         update=data.exchange_update)
 ENGINES = dict(yahoo=yahoo, exante=exante, stooq=stooq)
+RESUMABLE_ACTIONS = ('update', 'verify', 'analyse')  # actions skipping symbols done in the session
 ENGINE_ACTIONS = dict(erase=store.security_erase,
+                      migrate=store.security_migrate,
                       range=data.security_range,
                       update=data.security_update,
                       verify=data.security_verify,
                       clean=data.security_clean,
-                      analyse=data.security_analyse)
+                      analyse=data.security_analyse,
+                      panel=data.security_panel)
 
 
 def get_args():
@@ -23,10 +26,12 @@ def get_args():
 
     parser.add_argument('--web', action='store_true')
     parser.add_argument('--schedule', action='store_true')
+    parser.add_argument('--daily', action='store_true')
 
     parser.add_argument('--exchange', nargs='+')
     parser.add_argument('--engine', nargs='+')
     parser.add_argument('--security', nargs='+')
+    parser.add_argument('--resume', action='store_true')
 
     parser.add_argument('--log-to-file', action='store_true')
     parser.add_argument('--log-to-screen', action='store_true')
@@ -47,11 +52,16 @@ def main():
         if args.schedule:
             from src import schedule
             schedule.run_module(args.debug)
+        if args.daily:
+            from src import schedule
+            schedule.task_daily(resume=args.resume)
         for action_name in args.exchange or []:
-            EXCHANGE_ACTIONS[action_name]()
+            kwargs = dict(resume=args.resume) if action_name in RESUMABLE_ACTIONS else {}
+            EXCHANGE_ACTIONS[action_name](**kwargs)
         for engine_name in args.engine or []:
             for action_name in args.security or []:
-                ENGINE_ACTIONS[action_name](ENGINES[engine_name])
+                kwargs = dict(resume=args.resume) if action_name in RESUMABLE_ACTIONS else {}
+                ENGINE_ACTIONS[action_name](ENGINES[engine_name], **kwargs)
     except KeyboardInterrupt:
         LOG.info('TrendApp interrupted')
     except:
@@ -0,0 +1,58 @@
+import random
+from timeit import default_timer as timer
+
+from src import analyse
+from src.clazz import Clazz
+
+W_SIZES = [50, 100, 200]
+
+
+def random_series(size: int):
+    random.seed(0)
+    close = 100.0
+    series = []
+    for i in range(size):
+        close *= random.uniform(0.97, 1.03)
+        series += [Clazz(symbol='XOM.NYSE', timestamp=1000000000 + i * 86400,
+                         open=close, close=close, low=0.99 * close, high=1.01 * close,
+                         volume=random.randint(1000, 100000))]
+    return series
+
+
+def loop_engine(series):
+    for w_size in W_SIZES:
+        analyse.sma(series, w_size)
+        analyse.vma(series, w_size)
+        analyse.volatile(series, w_size)
+
+
+def vector_engine(columns):
+    return analyse.indicators(columns, W_SIZES)
+
+
+def measure(function, *args, repeat=5):
+    times = []
+    for _ in range(repeat):
+        start = timer()
+        function(*args)
+        times += [timer() - start]
+    return min(times)
+
+
+def main():
+    series = random_series(20 * 252)  # 20 years of daily bars
+    columns = analyse.to_columns(series)
+
+    loop_time = measure(loop_engine, series)
+    vector_time = measure(vector_engine, columns)
+    convert_time = measure(analyse.to_columns, series)
+    adapter_time = measure(analyse.from_columns, series, vector_engine(columns))
+
+    print(f'bars: {len(series)} windows: {W_SIZES}')
+    print(f'loop engine:   {1000 * loop_time:.2f}ms')
+    print(f'vector engine: {1000 * vector_time:.2f}ms speedup: {loop_time / vector_time:.0f}x')
+    print(f'to_columns:    {1000 * convert_time:.2f}ms from_columns: {1000 * adapter_time:.2f}ms')
+
+
+if __name__ == '__main__':
+    main()
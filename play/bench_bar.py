@@ -0,0 +1,44 @@
+import tracemalloc
+
+from bench_analyse import random_series, measure
+from src import swings, tool
+from src.clazz import Clazz, Bar
+
+
+def allocated(function, *args) -> int:
+    tracemalloc.start()
+    result = function(*args)
+    size, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del result
+    return size
+
+
+def to_clazz(documents):
+    return [Clazz(**d) for d in documents]
+
+
+def to_bar(documents):
+    return [Bar(d) for d in documents]
+
+
+def read_closes(series):
+    return sum(s.close for s in series)
+
+
+def main():
+    documents = [dict(s, _id=f'security_test_1d/{i}', _key=str(i), _rev='_bZ6pPAK---', **tool.SECURITY_SCORE_DEFAULT)
+                 for i, s in enumerate(random_series(20 * 252))]
+    clazz_series, bar_series = to_clazz(documents), to_bar(documents)
+
+    print(f'bars: {len(documents)}')
+    for name, convert, series in [('clazz', to_clazz, clazz_series), ('bar', to_bar, bar_series)]:
+        size = allocated(convert, documents)
+        print(f'{name:5} memory: {size / len(documents):.0f}B per bar'
+              f' convert: {1000 * measure(convert, documents):.2f}ms'
+              f' attribute read: {1000 * measure(read_closes, series):.2f}ms'
+              f' swings: {1000 * measure(swings.calculate, series):.2f}ms')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,39 @@
+from datetime import timezone
+from timeit import default_timer as timer
+
+from src import calendars, holidays, tool
+from src.tool import DateTime
+
+CALLS = 20000
+
+
+def walk_last_workday(exchange: str, dt: DateTime, holiday_set) -> DateTime:
+    """The former walk back over days constructing datetimes"""
+    d = dt.toordinal()
+    while True:
+        d -= 1
+        day = DateTime.fromordinal(d).replace(tzinfo=timezone.utc)
+        if day.weekday() in (0, 1, 2, 3, 4) and day not in holiday_set:
+            return day
+
+
+def main():
+    dts = [DateTime.from_timestamp(DateTime(2008, 1, 1).to_timestamp() + i * 21601) for i in range(CALLS)]
+
+    start = timer()
+    holiday_set = {DateTime.parse_datetime(dt) for dt in holidays.EXCHANGE_HOLIDAYS['WSE']}
+    expected = [walk_last_workday('WSE', dt, holiday_set).to_timestamp() for dt in dts]
+    print(f'former last_workday: {(timer() - start) * 1000:.1f}ms for {CALLS} calls')
+
+    start = timer()
+    calendars.sessions('WSE', tool.INTERVAL_1D)
+    print(f'compile: {(timer() - start) * 1000:.1f}ms')
+
+    start = timer()
+    results = [calendars.last_session('WSE', tool.INTERVAL_1D, dt.to_timestamp()) for dt in dts]
+    print(f'calendars last_session: {(timer() - start) * 1000:.1f}ms for {CALLS} calls')
+    assert results == expected
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,69 @@
+import tempfile
+from pathlib import Path
+from timeit import default_timer as timer
+
+import numpy as np
+
+from src import panel, cache, tool
+
+SYMBOLS = 3000
+SESSIONS = 20 * 252
+TS_FROM = 946857600  # 2000-01-03
+
+
+class CacheSeries:
+    """Serves symbol columns from the column cache like SecuritySeries.columns()"""
+
+    def __init__(self, column_cache: cache.ColumnCache):
+        self.column_cache = column_cache
+
+    def columns(self, symbol: str) -> np.ndarray:
+        return self.column_cache[symbol]
+
+
+def fill_cache(column_cache: cache.ColumnCache, sessions: np.ndarray):
+    random = np.random.default_rng(0)
+    for i in range(SYMBOLS):
+        columns = np.zeros(len(sessions), dtype=cache.BAR_DTYPE)
+        columns['timestamp'] = sessions
+        columns['close'] = 100.0 * np.cumprod(random.uniform(0.97, 1.03, len(sessions)))
+        columns['volume'] = random.integers(1000, 100000, len(sessions))
+        column_cache[f'S{i:04}.NYSE'] = columns
+
+
+def above_sma(close: np.ndarray, w_size: int) -> np.ndarray:
+    """Share of symbols closing above their SMA per session"""
+    cumsum = np.nancumsum(close, axis=0)
+    sma = np.full_like(close, np.nan)
+    sma[w_size - 1:] = (cumsum[w_size - 1:] - np.vstack([np.zeros((1, close.shape[1])), cumsum[:-w_size]])) / w_size
+    with np.errstate(invalid='ignore'):
+        return np.sum(close > sma, axis=1) / close.shape[1]
+
+
+def main():
+    with tempfile.TemporaryDirectory() as path:
+        sessions = panel.session_calendar('NYSE', tool.INTERVAL_1D, TS_FROM, TS_FROM + SESSIONS * 7 // 5 * 86400)
+        column_cache = cache.ColumnCache('security_bench_1d', Path(path))
+        fill_cache(column_cache, sessions)
+        symbols = [f'S{i:04}.NYSE' for i in range(SYMBOLS)]
+
+        start = timer()
+        panel.Panel('security_bench_1d', 'NYSE', Path(path)).update(CacheSeries(column_cache), symbols, tool.INTERVAL_1D)
+        build_time = timer() - start
+
+        start = timer()
+        nyse_panel = panel.Panel('security_bench_1d', 'NYSE', Path(path)).load()
+        close = np.array(nyse_panel['close'])
+        load_time = timer() - start
+
+        start = timer()
+        breadth = above_sma(close, 200)
+        breadth_time = timer() - start
+
+        print(f'panel: {close.shape[0]} sessions x {close.shape[1]} symbols {close.nbytes / 2 ** 20:.0f}MB per field')
+        print(f'build: {build_time:.2f}s load close: {1000 * load_time:.2f}ms'
+              f' above sma-200: {1000 * breadth_time:.2f}ms last: {breadth[-1]:.2f}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,86 @@
+import csv
+import random
+from datetime import date
+from io import StringIO
+from timeit import default_timer as timer
+
+from src import parser
+from src.clazz import Bar
+from src.tool import DateTime
+
+ROWS = 20 * 252
+REPEAT = 20
+EPOCH_ORDINAL = date(1970, 1, 1).toordinal()
+
+
+def stooq_content() -> bytes:
+    random.seed(0)
+    lines = ['<TICKER>,<PER>,<DATE>,<TIME>,<OPEN>,<HIGH>,<LOW>,<CLOSE>,<VOL>,<OPENINT>']
+    close = 100.0
+    for d in range(ROWS):
+        close *= random.uniform(0.97, 1.03)
+        day = DateTime.from_timestamp(946857600 + d * 86400).strftime('%Y%m%d')
+        lines += [f'S,D,{day},000000,{close:.2f},{close * 1.01:.2f},{close * 0.99:.2f},{close:.2f},1000,0']
+    return '\n'.join(lines).encode('utf-8')
+
+
+def yahoo_content() -> bytes:
+    random.seed(0)
+    lines = ['Date,Open,High,Low,Close,Adj Close,Volume']
+    close = 100.0
+    for d in range(ROWS):
+        close *= random.uniform(0.97, 1.03)
+        day = DateTime.from_timestamp(946857600 + d * 86400).strftime('%Y-%m-%d')
+        lines += [f'{day},{close:.2f},{close * 1.01:.2f},{close * 0.99:.2f},{close:.2f},{close:.2f},1000']
+    return '\n'.join(lines).encode('utf-8')
+
+
+def stooq_rows(content: bytes):
+    """The former stooq parser splitting lines with dates converted by ordinals"""
+    lines = content.decode('utf-8').splitlines()
+    header = lines[0].split(',')
+    i_date, i_open, i_high, i_low, i_close, i_volume = (header.index(f'<{c}>')
+                                                        for c in ('DATE', 'OPEN', 'HIGH', 'LOW', 'CLOSE', 'VOL'))
+    series = []
+    for line in lines[1:]:
+        fields = line.split(',')
+        day = fields[i_date]
+        timestamp = (date(int(day[:4]), int(day[4:6]), int(day[6:8])).toordinal() - EPOCH_ORDINAL) * 86400
+        series += [Bar.security('S.WSE', timestamp, float(fields[i_open]), float(fields[i_close]),
+                                float(fields[i_low]), float(fields[i_high]), int(fields[i_volume]))]
+    return series
+
+
+def yahoo_rows(content: bytes):
+    """The former yahoo parser with DictReader and strptime"""
+    series = []
+    for dt in csv.DictReader(StringIO(content.decode('utf-8'))):
+        timestamp = DateTime.strptime(dt['Date'], '%Y-%m-%d').to_timestamp()
+        series += [Bar.security('S.NYSE', timestamp, float(dt['Open']), float(dt['Close']),
+                                float(dt['Low']), float(dt['High']), int(dt['Volume']))]
+    return series
+
+
+def bench(title: str, function, content: bytes):
+    start = timer()
+    for _ in range(REPEAT):
+        result = function(content)
+    print(f'{title}: {(timer() - start) / REPEAT * 1000:.1f}ms')
+    return result
+
+
+def main():
+    for name, content, former, columns, date_format in (
+            ('stooq', stooq_content(), stooq_rows, parser.STOOQ_COLUMNS, parser.STOOQ_DATE_FORMAT),
+            ('yahoo', yahoo_content(), yahoo_rows, parser.YAHOO_COLUMNS, parser.YAHOO_DATE_FORMAT)):
+        print(f'{name} rows: {ROWS}')
+        expected = bench(' former parser', former, content)
+        bench(' columns', lambda c: parser.parse_ohlc(c, columns, date_format), content)
+        result = bench(' columns to data', lambda c: parser.to_series('S', parser.parse_ohlc(c, columns, date_format)[0]),
+                       content)
+        assert [s.timestamp for s in result] == [s.timestamp for s in expected]
+        assert [s.close for s in result] == [s.close for s in expected]
+
+
+if __name__ == '__main__':
+    main()
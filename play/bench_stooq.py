@@ -0,0 +1,72 @@
+import csv
+import random
+import tempfile
+import zipfile
+from io import StringIO
+from pathlib import Path
+from timeit import default_timer as timer
+
+from src import stooq, tool
+from src.tool import DateTime
+
+SYMBOLS = 400
+ROWS = 20 * 252
+SAMPLE = 50
+
+
+def write_zip(zip_path: Path):
+    random.seed(0)
+    dates = [DateTime.from_timestamp(946857600 + d * 86400).strftime('%Y%m%d') for d in range(ROWS)]
+    with zipfile.ZipFile(zip_path, 'w', zipfile.ZIP_DEFLATED) as zip_io:
+        for i in range(SYMBOLS):
+            lines = ['<TICKER>,<PER>,<DATE>,<TIME>,<OPEN>,<HIGH>,<LOW>,<CLOSE>,<VOL>,<OPENINT>']
+            close = 100.0
+            for date in dates:
+                close *= random.uniform(0.97, 1.03)
+                lines += [f'S{i},D,{date},000000,{close:.2f},{close:.2f},{close:.2f},{close:.2f},1000,0']
+            zip_io.writestr(f'data/daily/us/nyse stocks/1/s{i}.us.txt', '\n'.join(lines))
+
+
+def series_by_symbol(zip_path: Path, symbol: str, ts_from: int, ts_to: int):
+    """The former access reopening the zip and parsing rows with DictReader and strptime for every symbol"""
+    short_symbol, _ = tool.symbol_split(symbol)
+    with zipfile.ZipFile(zip_path) as zip_io:
+        name_list = zip_io.namelist()
+        path = f'data/daily/us/nyse stocks/1/{stooq.stooq_symbol(short_symbol)}.us.txt'
+        if path in name_list:
+            content = zip_io.read(path).decode('utf-8')
+            series = []
+            for dt in csv.DictReader(StringIO(content)):
+                timestamp = DateTime.strptime(dt['<DATE>'], '%Y%m%d').to_timestamp()
+                if ts_from <= timestamp <= ts_to:
+                    series += [dict(symbol=symbol, timestamp=timestamp, open=float(dt['<OPEN>']),
+                                    close=float(dt['<CLOSE>']), low=float(dt['<LOW>']), high=float(dt['<HIGH>']),
+                                    volume=int(dt['<VOL>']), **tool.SECURITY_SCORE_DEFAULT)]
+            return series
+    return []
+
+
+def main():
+    with tempfile.TemporaryDirectory() as path:
+        stooq.STOOQ_PATH = Path(path)
+        zip_path = stooq.stooq_zip_path(tool.INTERVAL_1D, 'NYSE')
+        write_zip(zip_path)
+        dt_from, dt_to = DateTime(1990, 1, 1), DateTime(2030, 1, 1)
+        ranges = [(f'S{i}.NYSE', dt_from, dt_to) for i in range(SYMBOLS)]
+
+        start = timer()
+        for symbol, _, _ in ranges[:SAMPLE]:
+            series_by_symbol(zip_path, symbol, dt_from.to_timestamp(), dt_to.to_timestamp())
+        by_symbol_time = (timer() - start) * SYMBOLS / SAMPLE
+
+        session = object.__new__(stooq.Session)  # skips downloads and the rate limiter of the session
+        session.zips = {}
+        for workers in (1, stooq.FETCH_WORKERS):
+            start = timer()
+            count = sum(len(series) for _, series in session.bulk(ranges, tool.INTERVAL_1D, workers))
+            print(f'bulk workers: {workers} bars: {count} time: {timer() - start:.2f}s')
+        print(f'by symbol (estimated from {SAMPLE} symbols): {by_symbol_time:.2f}s')
+
+
+if __name__ == '__main__':
+    main()
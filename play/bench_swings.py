@@ -0,0 +1,34 @@
+from timeit import default_timer as timer
+
+from bench_analyse import random_series, measure
+from src import swings, analyse, kernel
+from src.clazz import Clazz
+
+
+def calculate(series, jit):
+    swings.calculate([Clazz(s) for s in series], jit=jit)
+
+
+def action(series, jit):
+    analyse.action(series, jit=jit)
+
+
+def main():
+    series = random_series(20 * 252)  # 20 years of daily bars
+    swings.calculate(series)
+
+    start = timer()
+    calculate(series, True)
+    action(series, True)
+    compile_time = timer() - start  # the first call compiles or loads kernels from the numba cache
+
+    print(f'bars: {len(series)} numba: {kernel.ENABLED} first call: {1000 * compile_time:.2f}ms')
+    for name, function in [('swings', calculate), ('action', action)]:
+        python_time = measure(function, series, False)
+        jit_time = measure(function, series, True)
+        print(f'{name} python: {1000 * python_time:.2f}ms '
+              f'kernel: {1000 * jit_time:.2f}ms speedup: {python_time / jit_time:.1f}x')
+
+
+if __name__ == '__main__':
+    main()
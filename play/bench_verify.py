@@ -0,0 +1,52 @@
+from datetime import timedelta
+from timeit import default_timer as timer
+
+import numpy as np
+
+from src import data, calendars, tool
+from src.tool import DateTime
+
+SYMBOLS = 500
+SAMPLE = 5
+
+
+def former_verify(exchange: str, timestamps, dt_from: DateTime, dt_to: DateTime, interval: timedelta):
+    """The former walk over calendar days testing membership in a list of dates"""
+    dates = [DateTime.from_timestamp(t) for t in timestamps]
+    holidays = tool.exchange_holidays(exchange)
+    overlap = [d for d in dates if d in holidays]
+    missing = []
+    start = dt_from
+    while start <= dt_to:
+        if start.weekday() in (0, 1, 2, 3, 4):
+            if not (start in dates or start in holidays):
+                missing.append(start)
+        start += interval
+    return overlap, missing
+
+
+def main():
+    interval = tool.INTERVAL_1D
+    dt_from, dt_to = DateTime(2002, 1, 1), DateTime(2021, 12, 31)
+    sessions = calendars.sessions_between('WSE', interval, dt_from.to_timestamp(), dt_to.to_timestamp())
+    rng = np.random.default_rng(0)
+    series = [np.sort(rng.choice(sessions, len(sessions) - 10, replace=False)) for _ in range(SYMBOLS)]
+
+    start = timer()
+    for timestamps in series[:SAMPLE]:
+        expected = former_verify('WSE', timestamps.tolist(),
+                                 DateTime.from_timestamp(int(timestamps[0])), dt_to, interval)
+    print(f'former verify: {(timer() - start) * SYMBOLS / SAMPLE:.1f}s for {SYMBOLS} symbols')
+
+    start = timer()
+    for timestamps in series:
+        overlap, missing = data.time_series_verify('X.WSE', timestamps, int(timestamps[0]), dt_to.to_timestamp(),
+                                                   interval)
+    print(f'sorted set verify: {(timer() - start) * 1000:.1f}ms for {SYMBOLS} symbols')
+    timestamps = series[SAMPLE - 1]
+    _, missing = data.time_series_verify('X.WSE', timestamps, int(timestamps[0]), dt_to.to_timestamp(), interval)
+    assert [d.to_timestamp() for d in expected[1]] == missing.tolist()
+
+
+if __name__ == '__main__':
+    main()
@@ -1,16 +1,36 @@
-from typing import List
+from typing import List, Iterable, Optional, Dict, Tuple
 
-from src import schema
-from src.clazz import Clazz
+import numpy as np
 
+from src import schema, swings, kernel
+from src.clazz import Clazz, Bar
 
-def clean(series: List[Clazz]):
-    required = ['_id', '_rev', '_key'] + schema.SECURITY_SCHEMA['rule']['required']
+ROLLING_FIELDS = ('timestamp', 'open', 'close', 'low', 'high', 'volume')
+INDICATOR_FIELDS = ('close', 'volume', 'high', 'low')
+ACTION_STATE_FIELDS = ('profit', 'total', 'long', 'open_timestamp', 'volume')
+ACTION_STATE_DEFAULT = Clazz(timestamp=0, profit=0.0, total=0.0, long=0.0, open_timestamp=0, volume=0)
+
+
+def clean(series: List[Bar], *keep: str):
+    required = ['_id', '_rev', '_key'] + schema.SECURITY_SCHEMA['rule']['required'] + list(keep)
     for i, s in enumerate(series):
-        series[i] = Clazz({k: v for k, v in s.items() if k in required})
+        series[i] = Bar({k: v for k, v in s.items() if k in required})
+
 
+def delta(loaded: List[Bar], series: List[Bar]) -> List[Clazz]:
+    """Prepares database updates only for fields changed since loaded, removed fields are set to None"""
+    entries = []
+    for s1, s2 in zip(loaded, series):
+        changed = [k for k, v in s2.items() if k not in s1 or s1[k] != v]
+        removed = [k for k in s1 if k not in s2]
+        if changed or removed:
+            entry = s2.entry(*changed)
+            entry.update({k: None for k in removed})
+            entries += [entry]
+    return entries
 
-def sma(series: List[Clazz], w_size: int):
+
+def sma(series: List[Bar], w_size: int):
     if len(series) >= w_size:
         sma_name = f'sma-{w_size}'
         sum_value = sum([s.close for s in series[:w_size]])
@@ -20,7 +40,7 @@ def sma(series: List[Clazz], w_size: int):
             s1[sma_name] = sum_value / w_size
 
 
-def vma(series: List[Clazz], w_size: int):
+def vma(series: List[Bar], w_size: int):
     if len(series) >= w_size:
         vma_name = f'vma-{w_size}'
         sum_value = sum([s.close * s.volume for s in series[:w_size]])
@@ -34,7 +54,7 @@ def vma(series: List[Clazz], w_size: int):
                 s1[vma_name] = sum_value / sum_volume
 
 
-def volatile(series: List[Clazz], w_size: int):
+def volatile(series: List[Bar], w_size: int):
     if len(series) >= w_size:
         atr_name = f'atr-{w_size}'
         atr_value = sum([s.high - s.low for s in series[:w_size]])
@@ -44,18 +64,146 @@ def volatile(series: List[Clazz], w_size: int):
             s1[atr_name] = atr_value / w_size
 
 
-def action(series: List[Clazz]) -> Clazz:
+def to_columns(series: List[Bar], fields: Iterable[str] = INDICATOR_FIELDS) -> Dict[str, np.ndarray]:
+    return {f: np.array([s[f] for s in series], dtype=np.float64) for f in fields}
+
+
+def window_sum(values: np.ndarray, w_size: int) -> np.ndarray:
+    """Sums of sliding windows, the result is aligned to the window end and NaN before the first full window"""
+    result = np.full(len(values), np.nan)
+    if len(values) >= w_size:
+        cumsum = np.cumsum(np.concatenate([[0.0], values]))
+        result[w_size - 1:] = cumsum[w_size:] - cumsum[:-w_size]
+    return result
+
+
+def indicators(columns: Dict[str, np.ndarray],
+               w_sizes: Iterable[int],
+               names: Iterable[str] = ('sma', 'vma', 'atr')) -> Dict[str, np.ndarray]:
+    """Computes indicators of all window sizes at once, keys are named like the datum fields: sma-50, vma-50, atr-50"""
+    results = {}
+    close = columns['close']
+    for w_size in w_sizes:
+        if 'sma' in names:
+            results[f'sma-{w_size}'] = window_sum(close, w_size) / w_size
+        if 'vma' in names:
+            volume = columns['volume']
+            sum_value = window_sum(close * volume, w_size)
+            sum_volume = window_sum(volume, w_size)
+            with np.errstate(divide='ignore', invalid='ignore'):
+                results[f'vma-{w_size}'] = np.where(sum_volume != 0, sum_value / sum_volume, np.nan)
+        if 'atr' in names:
+            results[f'atr-{w_size}'] = window_sum(columns['high'] - columns['low'], w_size) / w_size
+    return results
+
+
+def from_columns(series: List[Bar], results: Dict[str, np.ndarray]):
+    """Sets indicator values as fields of the series skipping undefined (NaN) ones"""
+    for name, values in results.items():
+        for s, v in zip(series, values.tolist()):
+            if v == v:
+                s[name] = v
+
+
+def rolling_split(series: List[Bar], state: Optional[Clazz], offset: int = 0) -> int:
+    """
+    Returns the index of the first datum appended since the rolling state has been saved
+    or 0 if the history has been rewritten in the meantime and it needs to be recomputed,
+    offset is the number of data preceding the series if only the latest part is loaded
+    """
+    if state:
+        end = state.count - offset
+        begin = end - len(state.tail)
+        if 0 <= begin and end <= len(series) and series[end - 1].timestamp == state.timestamp:
+            tail = [[s[f] for f in ROLLING_FIELDS] for s in series[begin:end]]
+            if tail == state.tail:
+                return end
+    return 0
+
+
+def rolling(series: List[Bar],
+            state: Optional[Clazz],
+            w_sizes: Iterable[int],
+            names: Iterable[str] = ('sma', 'vma')) -> Clazz:
+    """
+    Extends indicators over the series appended to the rolling state, the state keeps the window tail.
+    :returns the rolling state to be persisted for the next run
+    """
+    tail = [Bar(zip(ROLLING_FIELDS, t)) for t in state.tail] if state else []
+    count = state.count if state else 0
+    extended = tail + series
+    results = indicators(to_columns(extended), w_sizes, names)
+    from_columns(series, {k: v[len(tail):] for k, v in results.items()})
+
+    if not extended:
+        return state
+    tail = extended[-max(w_sizes):]
+    return Clazz(timestamp=extended[-1].timestamp,
+                 count=count + len(series),
+                 tail=[[s[f] for f in ROLLING_FIELDS] for s in tail])
+
+
+def action_kernel(series: List[Bar],
+                  state: Clazz,
+                  checkpoint: Optional[int]) -> Tuple[Clazz, Optional[Clazz]]:
+    """Runs action() as the compiled kernel over the series columns"""
+    timestamps = np.fromiter((s.timestamp for s in series), dtype=np.int64, count=len(series))
+    low_scores = np.fromiter((s.low_score for s in series), dtype=np.int64, count=len(series))
+    closes = np.fromiter((s.close for s in series), dtype=np.float64, count=len(series))
+    kinds = np.full(len(series), kernel.ACTION_NONE, dtype=np.int64)
+    open_timestamps = np.zeros(len(series), dtype=np.int64)
+    open_longs = np.zeros(len(series))
+    state_array = np.array([state.timestamp] + [state[k] for k in ACTION_STATE_FIELDS], dtype=np.float64)
+
+    result = kernel.action(timestamps, low_scores, closes, state_array,
+                           -1 if checkpoint is None else checkpoint, kinds, open_timestamps, open_longs)
+
+    begin = int(np.searchsorted(timestamps, state.timestamp)) if state.timestamp else 0
+    for s in series[begin:]:
+        s.test = Clazz()
+    for i in np.flatnonzero(kinds).tolist():
+        s = series[i]
+        if kinds[i] == kernel.ACTION_OPEN:
+            s.test.long = s.close
+        else:
+            s.test.open_timestamp = int(open_timestamps[i])
+            s.test.open_long = float(open_longs[i])
+            s.test.short = s.close
+            s.test.profit = s.test.short - s.test.open_long
+
+    checkpoint_state = None
+    if result[6] >= 0:
+        checkpoint_state = Clazz(timestamp=int(result[6]), profit=float(result[7]), total=float(result[8]),
+                                 long=float(result[9]), open_timestamp=int(result[10]), volume=int(result[11]))
+    return Clazz(profit=float(result[1]), total=float(result[2]), volume=int(result[5])), checkpoint_state
+
+
+def action(series: List[Bar],
+           state: Optional[Clazz] = None,
+           checkpoint: int = None,
+           jit: bool = None) -> Tuple[Clazz, Optional[Clazz]]:
     """
     profit - total profit or loss
     total - total cash required for all open positions
     long - cash required for single long position
     open_timestamp - timestamp at the opening
     volume - number of all opened longs
+    The simulation is resumed from the state, the state at the checkpoint timestamp is returned to resume it next time.
+    The compiled kernel is used if jit is set, it defaults to kernel.ENABLED.
     """
-    profit = total = long = 0.0
-    open_timestamp = volume = 0
+    state = state or ACTION_STATE_DEFAULT
+    if kernel.ENABLED if jit is None else jit:
+        return action_kernel(series, state, checkpoint)
+    profit, total, long, open_timestamp, volume = (state[k] for k in ACTION_STATE_FIELDS)
+    checkpoint_state = None
 
     for s in series:
+        if s.timestamp < state.timestamp:
+            continue
+        if checkpoint is not None and not checkpoint_state and checkpoint <= s.timestamp:
+            checkpoint_state = Clazz(zip(ACTION_STATE_FIELDS, (profit, total, long, open_timestamp, volume)),
+                                     timestamp=s.timestamp)
+
         s.test = Clazz()
 
         if (long == 0.0) and (4 <= s.low_score):
@@ -74,4 +222,12 @@ def action(series: List[Clazz]) -> Clazz:
 
             profit += s.test.profit
 
-    return Clazz(profit=profit, total=total, volume=volume)
+    return Clazz(profit=profit, total=total, volume=volume), checkpoint_state
+
+
+def state_from(state: Clazz) -> int:
+    """:returns the first timestamp the series has to be loaded from to continue the analysis"""
+    timestamps = [state.tail[0][0], swings.state_from(state.swings)]
+    if state.get('action'):
+        timestamps += [state.action.timestamp]
+    return min(timestamps)
@@ -0,0 +1,80 @@
+import logging
+import shutil
+from pathlib import Path
+from typing import List, Dict, Optional
+
+import numpy as np
+
+from src import config
+
+LOG = logging.getLogger(__name__)
+
+BAR_DTYPE = np.dtype([('timestamp', '<i8'),
+                      ('open', '<f8'),
+                      ('high', '<f8'),
+                      ('low', '<f8'),
+                      ('close', '<f8'),
+                      ('volume', '<i8')])
+
+
+def unique_columns(columns: np.ndarray) -> np.ndarray:
+    """Sorts records by timestamp, the first record wins for a duplicated timestamp"""
+    _, index = np.unique(columns['timestamp'], return_index=True)
+    return columns[index]
+
+
+def to_columns(documents: List[Dict]) -> np.ndarray:
+    columns = np.array([tuple(d[f] for f in BAR_DTYPE.names) for d in documents], dtype=BAR_DTYPE)
+    return unique_columns(columns[::-1])  # the latest document wins
+
+
+class ColumnCache:
+    """
+    Columnar copy of a security collection kept in the store folder,
+    one memory-mapped file per symbol with contiguous (timestamp, open, high, low, close, volume) records.
+    """
+
+    def __init__(self, name: str, path: Path = None):
+        self.name = name
+        self.path = (path or config.STORE_PATH).joinpath('cache', name)
+
+    def symbol_path(self, symbol: str) -> Path:
+        return self.path.joinpath(f'{symbol}.npy')
+
+    def __contains__(self, symbol: str) -> bool:
+        return self.symbol_path(symbol).exists()
+
+    def __getitem__(self, symbol: str) -> Optional[np.ndarray]:
+        symbol_path = self.symbol_path(symbol)
+        if symbol_path.exists():
+            return np.load(symbol_path, mmap_mode='r')
+        return None
+
+    def __setitem__(self, symbol: str, columns: np.ndarray):
+        assert columns.dtype == BAR_DTYPE
+        self.path.mkdir(parents=True, exist_ok=True)
+        symbol_path = self.symbol_path(symbol)
+        symbol_path_pending = symbol_path.with_suffix('.pending')
+        with symbol_path_pending.open('wb') as write_io:
+            np.save(write_io, columns)
+        symbol_path_pending.replace(symbol_path)
+
+    def range(self, symbol: str, ts_from: int, ts_to: int = None) -> Optional[np.ndarray]:
+        columns = self[symbol]
+        if columns is None:
+            return None
+        timestamps = columns['timestamp']
+        begin = np.searchsorted(timestamps, ts_from, side='left')
+        end = len(timestamps) if ts_to is None else np.searchsorted(timestamps, ts_to, side='right')
+        return columns[begin:end]
+
+    def merge(self, symbol: str, documents: List[Dict]):
+        """Merges documents into the cached symbol, only symbols fully loaded before are kept in sync"""
+        columns = self[symbol]
+        if columns is not None and documents:
+            self[symbol] = unique_columns(np.concatenate([to_columns(documents), columns]))
+
+    def erase(self):
+        if self.path.exists():
+            LOG.info(f'Erasing column cache: {self.path.as_posix()}')
+            shutil.rmtree(self.path)
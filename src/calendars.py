@@ -0,0 +1,94 @@
+from datetime import timedelta
+from functools import lru_cache
+from typing import List, Optional, Tuple
+
+import numpy as np
+
+from src import holidays
+
+DAY = 24 * 60 * 60
+HOUR = 60 * 60
+INTERVAL_1H = timedelta(hours=1)
+INTERVAL_1D = timedelta(days=1)
+
+CALENDAR_FROM = np.datetime64('1970-01-01', 'D')
+CALENDAR_TO = np.datetime64('2050-12-31', 'D')
+
+
+@lru_cache(maxsize=None)
+def exchange_holidays(exchange: str) -> np.ndarray:
+    """Sorted timestamps of the holiday table of the exchange"""
+    days = np.array(sorted(holidays.EXCHANGE_HOLIDAYS[exchange]), dtype='datetime64[s]').astype(np.int64)
+    days.flags.writeable = False
+    return days
+
+
+@lru_cache(maxsize=None)
+def sessions(exchange: str, interval: timedelta) -> np.ndarray:
+    """
+    Sorted timestamps of all sessions of the exchange compiled once, daily sessions are working days
+    without the exchange holidays and hourly sessions are hours of those days
+    """
+    if interval not in (INTERVAL_1D, INTERVAL_1H):
+        raise ValueError(f'There is no calendar of the interval: {interval}')
+    days = np.arange(CALENDAR_FROM, CALENDAR_TO + 1, dtype='datetime64[D]')
+    days = days[np.is_busday(days, holidays=exchange_holidays(exchange).astype('datetime64[s]').astype('datetime64[D]'))]
+    timestamps = days.astype('datetime64[s]').astype(np.int64)
+    if interval == INTERVAL_1H:
+        timestamps = (timestamps[:, np.newaxis] + np.arange(0, DAY, HOUR)).ravel()
+    timestamps.flags.writeable = False
+    return timestamps
+
+
+def last_session(exchange: str, interval: timedelta, ts: int) -> int:
+    """
+    The daily session is the last one before the day of the timestamp as the session of the day is not closed yet,
+    the hourly session is the last one starting at or before the timestamp
+    """
+    timestamps = sessions(exchange, interval)
+    if interval == INTERVAL_1D:
+        index = np.searchsorted(timestamps, ts - ts % DAY, side='left') - 1
+    else:
+        index = np.searchsorted(timestamps, ts, side='right') - 1
+    assert 0 <= index, f'The timestamp {ts} precedes the calendar of {exchange}'
+    return int(timestamps[index])
+
+
+def next_session(exchange: str, interval: timedelta, ts: int) -> int:
+    """The first session starting after the timestamp"""
+    timestamps = sessions(exchange, interval)
+    index = np.searchsorted(timestamps, ts, side='right')
+    assert index < len(timestamps), f'The timestamp {ts} follows the calendar of {exchange}'
+    return int(timestamps[index])
+
+
+def sessions_between(exchange: str, interval: timedelta, ts_from: int, ts_to: int) -> np.ndarray:
+    """Sessions starting from ts_from up to ts_to inclusive"""
+    timestamps = sessions(exchange, interval)
+    return timestamps[np.searchsorted(timestamps, ts_from, side='left'):np.searchsorted(timestamps, ts_to, side='right')]
+
+
+def count_sessions(exchange: str, interval: timedelta, ts_from: int, ts_to: int) -> int:
+    timestamps = sessions(exchange, interval)
+    return int(np.searchsorted(timestamps, ts_to, side='right') - np.searchsorted(timestamps, ts_from, side='left'))
+
+
+def plan_requests(exchange: str, interval: timedelta,
+                  missing: np.ndarray, max_size: Optional[int]) -> List[Tuple[int, int]]:
+    """
+    Covers sorted missing sessions with the fewest requests spanning at most max_size sessions each,
+    sessions already stored between missing ones are requested again rather than splitting the request.
+    :returns (ts_from, ts_to) of the first and last missing session of every request
+    """
+    if not len(missing):
+        return []
+    if max_size is None:
+        return [(int(missing[0]), int(missing[-1]))]
+    indexes = np.searchsorted(sessions(exchange, interval), missing)
+    requests = []
+    begin = 0
+    while begin < len(indexes):
+        end = int(np.searchsorted(indexes, indexes[begin] + max_size, side='left'))
+        requests += [(int(missing[begin]), int(missing[end - 1]))]
+        begin = end
+    return requests
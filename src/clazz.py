@@ -1,12 +1,14 @@
-from typing import Any, Dict
+from collections.abc import MutableMapping
+from typing import Any, Dict, Iterator
 
 
 class Clazz(dict):
 
     def __init__(self, *args, **kwargs):
-        args = [Clazz(**a) if type(a) == dict else a for a in args]
-        kwargs = {k: Clazz(**v) if type(v) == dict else v for k, v in kwargs.items()}
-        super().__init__(*args, **kwargs)
+        if args or kwargs:
+            args = [Clazz(**a) if type(a) == dict else a for a in args]
+            kwargs = {k: Clazz(**v) if type(v) == dict else v for k, v in kwargs.items()}
+            super().__init__(*args, **kwargs)
 
     def __getattr__(self, key):
         return self.__getitem__(key)
@@ -29,3 +31,106 @@ class Clazz(dict):
 
     def to_dict(self) -> Dict[str, Any]:
         return {k: v if type(v) != Clazz else v.to_dict() for k, v in self.items()}
+
+
+BAR_FIELDS = ('_id', '_key', '_rev', 'symbol', 'timestamp', 'open', 'close', 'low', 'high', 'volume',
+              'low_score', 'high_score', 'valid_low_score', 'valid_high_score', 'test')
+BAR_FIELD_SET = frozenset(BAR_FIELDS)
+
+
+class Bar(MutableMapping):
+    """
+    Compact security datum, schema fields are slots read without __getattr__
+    and the other fields like indicators are kept in the extra dictionary created on demand.
+    It behaves as the mapping of its document, documents are converted only when read and written to the database.
+    """
+    __slots__ = BAR_FIELDS + ('extra',)
+
+    def __init__(self, *args, **kwargs):
+        self.extra = None
+        self.update(*args, **kwargs)
+
+    @classmethod
+    def security(cls, symbol: str, timestamp: int,
+                 open: float, close: float, low: float, high: float, volume: int) -> 'Bar':
+        """New datum with default scores built without the mapping update, it is the fast path of parsers"""
+        bar = cls.__new__(cls)
+        bar.extra = None
+        bar.symbol, bar.timestamp, bar.open, bar.close, bar.low, bar.high, bar.volume = \
+            symbol, timestamp, open, close, low, high, volume
+        bar.low_score = bar.high_score = bar.valid_low_score = bar.valid_high_score = 0
+        bar.test = Clazz()
+        return bar
+
+    def __getattr__(self, key):
+        extra = self.extra if key != 'extra' else None
+        if extra and key in extra:
+            return extra[key]
+        raise AttributeError(key)
+
+    def __getitem__(self, key):
+        try:
+            return getattr(self, key) if key in BAR_FIELD_SET else self.extra[key]
+        except (AttributeError, KeyError, TypeError):
+            raise KeyError(key) from None
+
+    def __setitem__(self, key, value):
+        if key in BAR_FIELD_SET:
+            setattr(self, key, value)
+        elif self.extra is None:
+            self.extra = {key: value}
+        else:
+            self.extra[key] = value
+
+    def update(self, *args, **kwargs):
+        """Sets fields from a mapping or (key, value) pairs, nested dictionaries are converted like in Clazz"""
+        extra = self.extra
+        for items in args + (kwargs,):
+            for k, v in (items.items() if hasattr(items, 'items') else items):
+                if type(v) == dict:
+                    v = Clazz(**v)
+                if k in BAR_FIELD_SET:
+                    setattr(self, k, v)
+                elif extra is None:
+                    extra = self.extra = {k: v}
+                else:
+                    extra[k] = v
+
+    def __delitem__(self, key):
+        try:
+            if key in BAR_FIELD_SET:
+                delattr(self, key)
+            else:
+                del self.extra[key]
+        except (AttributeError, KeyError, TypeError):
+            raise KeyError(key) from None
+
+    def __contains__(self, key) -> bool:
+        if key in BAR_FIELD_SET:
+            return hasattr(self, key)
+        return bool(self.extra) and key in self.extra
+
+    def __iter__(self) -> Iterator[str]:
+        for f in BAR_FIELDS:
+            if hasattr(self, f):
+                yield f
+        if self.extra:
+            yield from self.extra
+
+    def __len__(self) -> int:
+        return sum(1 for _ in self)
+
+    def __repr__(self) -> str:
+        return f'Bar({self.to_dict()})'
+
+    def entry(self, *fields) -> Clazz:
+        """Prepares dictionary for database update"""
+        return Clazz(**{f: self[f] for f in ('_id',) + fields})
+
+    def clean(self, *args):
+        for a in args:
+            if a in self:
+                del self[a]
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {k: v if type(v) != Clazz else v.to_dict() for k, v in self.items()}
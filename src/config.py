@@ -21,6 +21,9 @@ LOG_FORMAT = '[%(asctime)s] [%(levelname)s]\t[%(module)s]\t%(message)s'
 
 EXCHANGES = ('WSE', 'XETRA', 'LSE', 'NASDAQ', 'NYSE')
 HEALTH_MISSING_LIMIT = 20
+ARANGO_DB_POOL_SIZE = 16
+RATE_LIMITS = {'yahoo': {'rate': 1.6, 'burst': 2, 'in-flight': 4}}
+RATE_LIMIT_IN_FLIGHT = 8
 
 
 @lru_cache(maxsize=1)
@@ -72,3 +75,21 @@ def arango_db_auth() -> Tuple[str, str, str, str]:
     config = load_file()
     arango_config = config['arango-db']
     return arango_config['url'], arango_config['username'], arango_config['password'], arango_config['database']
+
+
+def arango_db_pool_size() -> int:
+    config = load_file()
+    return config['arango-db'].get('pool-size', ARANGO_DB_POOL_SIZE)
+
+
+def rate_limit(provider: str) -> Tuple[float, int, int]:
+    """
+    :returns (rate, burst, in-flight) of the provider from the config file or defaults,
+    providers without any limit are throttled by the loop delay
+    """
+    config = load_file()
+    delay = config['system']['loop-delay']
+    limit = {'rate': 1.0 / delay if delay > 0 else 0.0, 'burst': 1, 'in-flight': RATE_LIMIT_IN_FLIGHT}
+    limit.update(RATE_LIMITS.get(provider, {}))
+    limit.update(config.get('rate-limit', {}).get(provider, {}))
+    return limit['rate'], limit['burst'], limit['in-flight']
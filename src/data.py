@@ -1,21 +1,27 @@
 import logging
+import urllib.error
+from collections import Counter, defaultdict
 from datetime import timedelta
-from typing import List, Tuple, Any, Dict
+from typing import List, Tuple, Any, Dict, Iterable, Optional
 
+import numpy as np
 import orjson as json
 import pandas as pd
 import requests
 from tenacity import retry, stop_after_attempt, wait_fixed, retry_if_exception_type
 
-from src import log, config, tool, flow, store, exante, analyse, swings
-from src.clazz import Clazz
+from src import log, config, tool, flow, store, exante, analyse, swings, panel, calendars
+from src.clazz import Clazz, Bar
 from src.tool import DateTime
 
 LOG = logging.getLogger(__name__)
 
+# provider sessions retry their requests, it is left for remote reads outside of them
 remote_retry = retry(stop=stop_after_attempt(2),
                      wait=wait_fixed(100),
-                     retry=retry_if_exception_type(requests.exceptions.ConnectionError))
+                     retry=retry_if_exception_type((requests.exceptions.ConnectionError, urllib.error.URLError)))
+
+CHECKPOINT_SIZE = 100  # symbols analysed in a transaction
 
 INDEX_SP500 = ('https://en.wikipedia.org/wiki/List_of_S%26P_500_companies', 0, 'Symbol', '')
 INDEX_FTSE100 = ('https://en.wikipedia.org/wiki/FTSE_100_Index', 3, 'EPIC', '')
@@ -29,6 +35,7 @@ EXCHANGE_INDEX = {'NYSE': INDEX_SP500,
                   'WSE': INDEX_WIG30}
 
 
+@remote_retry
 def read_major_indices() -> Dict[str, List]:
     exchanges = {}
     for exchange_name, (url, index, column_name, suffix) in EXCHANGE_INDEX.items():
@@ -39,16 +46,23 @@ def read_major_indices() -> Dict[str, List]:
     return exchanges
 
 
-@remote_retry
-def exchange_update():
+def exchange_update(resume: bool = False):
     LOG.info(f'>> {exchange_update.__name__}')
 
+    checkpoints = {}
+    for exchange_name in config.EXCHANGES:
+        last_session = tool.last_session(exchange_name, tool.INTERVAL_1D, DateTime.now())
+        checkpoints[exchange_name] = store.Checkpoint('exchange', 'update', exchange_name, last_session, resume)
+    exchanges = [e for e, checkpoint in checkpoints.items() if e not in checkpoint]
+    if not exchanges:
+        return
+
     indices = read_major_indices()
     shortables = exante.read_shortables()
 
     with store.ExchangeSeries(editable=True) as exchange_series:
         with exante.Session() as session:
-            for exchange_name in config.EXCHANGES:
+            for exchange_name in exchanges:
                 exchange_index = indices[exchange_name]
                 exchange_securities = {s.symbol: s for s in exchange_series[exchange_name]}
                 new_documents = []
@@ -71,6 +85,9 @@ def exchange_update():
                 exchange_series += new_documents
                 LOG.info(f'Securities: {len(new_documents)} imported to the exchange: {exchange_name}')
 
+    for exchange_name in exchanges:
+        checkpoints[exchange_name] += [exchange_name]  # the exchange is the item of the stage
+
 
 def security_range(engine: Any):
     interval = tool.INTERVAL_1D
@@ -82,180 +99,322 @@ def security_range(engine: Any):
                          default=tool.json_default).decode('utf-8'))
 
 
-def security_update(engine: Any):
-    security_update_by_interval(engine, tool.INTERVAL_1D)
+def security_update(engine: Any, exchanges: Iterable[str] = config.EXCHANGES, resume: bool = False):
+    security_update_by_interval(engine, tool.INTERVAL_1D, exchanges, resume)
     if engine == exante:
-        security_update_by_interval(engine, tool.INTERVAL_1H)
+        security_update_by_interval(engine, tool.INTERVAL_1H, exchanges, resume)
 
 
-@remote_retry
-def security_update_by_interval(engine: Any, interval: timedelta):
-    LOG.info(f'>> {security_update.__name__} source: {tool.source_name(engine, interval)}')
-
-    default_range = Clazz(dt_to=config.datetime_from())
-    with engine.SecuritySeries(interval) as security_series:
-        time_range = security_series.time_range()
-        LOG.debug(f'Time range entries: {len(time_range)}')
-
-    for exchange_name in config.EXCHANGES:
-        with store.ExchangeSeries() as exchange_series:
-            securities = exchange_series[exchange_name]
+def security_update_by_interval(engine: Any,
+                                interval: timedelta,
+                                exchanges: Iterable[str] = config.EXCHANGES,
+                                resume: bool = False):
+    source_name = tool.source_name(engine, interval)
+    LOG.info(f'>> {security_update.__name__} source: {source_name}')
 
-        with engine.Session() as session:
-            with flow.Progress(f'security-update: {exchange_name}', securities) as progress:
-                for security in securities:
-                    progress(security.symbol)
-                    dt_from = time_range.get(security.symbol, default_range).dt_to
-                    dt_to = tool.last_session(exchange_name, interval, DateTime.now())
-                    for slice_from, slice_to in tool.time_slices(dt_from, dt_to, interval, 4096):
-                        time_series = session.series(security.symbol, slice_from, slice_to, interval)
+    ts_from = config.datetime_from().to_timestamp()
+    security_series = engine.SecuritySeries(interval, editable=True)
+    with security_series.write_behind(overwrite_mode=store.OVERWRITE_UPDATE) as buffer:
+        for exchange_name in exchanges:
+            with store.ExchangeSeries() as exchange_series:
+                securities = exchange_series[exchange_name]
 
-                        with engine.SecuritySeries(interval, editable=True) as security_series:
-                            security_series += time_series
+            last_session = tool.last_session(exchange_name, interval, DateTime.now())
+            checkpoint = store.Checkpoint(source_name, 'update', exchange_name, last_session, resume)
+            securities = [s for s in securities if s.symbol not in checkpoint]
 
-        LOG.info(f'Securities: {len(securities)} updated in the exchange: {exchange_name}')
+            with engine.SecuritySeries(interval) as stored_series:
+                columns = stored_series.bulk_columns(s.symbol for s in securities)
 
+            unfilled_name = tool.unfilled_name(engine, interval, exchange_name)
+            with store.File(unfilled_name) as unfilled:
+                unfilled = dict(unfilled)
 
-def time_series_verify(engine: Any,
-                       symbol: str,
-                       dt_from: DateTime, dt_to: DateTime,
-                       interval: timedelta) -> Tuple[List[DateTime], List[DateTime]]:
-    with engine.SecuritySeries(interval) as security_series:
-        time_series = security_series[symbol]
-
+            ts_to = last_session.to_timestamp()
+            ranges = []
+            missing_by_symbol = {}
+            for security in securities:
+                timestamps = columns[security.symbol]['timestamp']
+                missing = missing_sessions(security.symbol, timestamps, ts_from, ts_to, interval,
+                                           np.array(unfilled.get(security.symbol, []), dtype=np.int64))
+                missing_by_symbol[security.symbol] = missing
+                ranges += [(security.symbol, DateTime.from_timestamp(request_from), DateTime.from_timestamp(request_to))
+                           for request_from, request_to in
+                           calendars.plan_requests(exchange_name, interval, missing, engine.PLAN_SIZE)]
+            LOG.debug(f'Requests: {len(ranges)} planned for the exchange: {exchange_name}')
+
+            remaining = Counter(symbol for symbol, _, _ in ranges)
+            completed = [s.symbol for s in securities if s.symbol not in remaining]
+            fetched = defaultdict(list)
+            new_unfilled = {}
+            with engine.Session() as session:
+                with flow.Progress(f'security-update: {exchange_name}', ranges) as progress:
+                    for symbol, series in session.bulk(ranges, interval, engine.FETCH_WORKERS):
+                        progress(symbol)
+                        buffer += unstored_series(series, columns[symbol]['timestamp'])
+                        fetched[symbol] += [s.timestamp for s in series]
+                        remaining[symbol] -= 1
+                        if not remaining[symbol]:
+                            completed += [symbol]
+                            holes = unfilled_sessions(missing_by_symbol.pop(symbol), columns[symbol]['timestamp'],
+                                                      np.array(fetched.pop(symbol), dtype=np.int64))
+                            if interval == tool.INTERVAL_1D and len(holes):  # hourly holes are never requested again
+                                new_unfilled[symbol] = sorted(set(unfilled.get(symbol, [])) | set(holes.tolist()))
+                        if not buffer.documents:  # all the buffered series have been committed
+                            checkpoint += completed
+                            completed = []
+            buffer.flush()
+            checkpoint += completed
+            if new_unfilled:
+                with store.File(unfilled_name, editable=True) as unfilled:
+                    for symbol, sessions in new_unfilled.items():
+                        unfilled[symbol] = sessions
+                LOG.info(f'Securities: {len(new_unfilled)} have sessions the provider does not fill')
+
+            LOG.info(f'Securities: {len(securities)} updated in the exchange: {exchange_name}')
+
+
+def unfilled_sessions(missing: np.ndarray, timestamps: np.ndarray, fetched: np.ndarray) -> np.ndarray:
+    """
+    Missing sessions which the provider has skipped although it returned later bars are holes like suspensions
+    which would be requested again every day, sessions following the last fetched bar may be published later
+    """
+    if not len(fetched):
+        return fetched
+    first = timestamps[0] if len(timestamps) else fetched.min()
+    holes = missing[(first < missing) & (missing < fetched.max())]
+    return np.setdiff1d(holes, fetched)
+
+
+def unstored_series(series: List[Bar], timestamps: np.ndarray) -> List[Bar]:
+    """Requests span stored sessions between missing ones, the stored bars are kept as they hold the analysis"""
+    if not len(timestamps):
+        return series
+    unstored = np.isin(np.array([s.timestamp for s in series], dtype=np.int64), timestamps, invert=True)
+    return [s for s, u in zip(series, unstored) if u]
+
+
+def missing_sessions(symbol: str,
+                     timestamps: np.ndarray,
+                     ts_from: int, ts_to: int,
+                     interval: timedelta,
+                     unfilled: np.ndarray = None) -> np.ndarray:
+    """
+    Daily sessions missing from the first stored one up to ts_to are backfilled except the unfilled ones
+    the provider has not returned before, hourly sessions cover whole days so only those following
+    the last stored one are missing
+    """
     _, exchange = tool.symbol_split(symbol)
-    dates = [DateTime.from_timestamp(s.timestamp) for s in time_series]
-    holidays = tool.exchange_holidays(exchange)
-
-    overlap = [d for d in dates if d in holidays]
-
-    missing = []
-    start = dt_from
-    while start <= dt_to:
-        if start.weekday() in (0, 1, 2, 3, 4):
-            if not (start in dates or start in holidays):
-                missing.append(start)
-        start += interval
-
+    if not len(timestamps):
+        return calendars.sessions_between(exchange, interval, ts_from, ts_to)
+    if interval != tool.INTERVAL_1D:
+        return calendars.sessions_between(exchange, interval, int(timestamps[-1]) + 1, ts_to)
+    _, missing = time_series_verify(symbol, timestamps, int(timestamps[0]), ts_to, interval)
+    if unfilled is not None and len(unfilled):
+        missing = np.setdiff1d(missing, unfilled, assume_unique=True)
+    return missing
+
+
+def time_series_verify(symbol: str,
+                       timestamps: np.ndarray,
+                       ts_from: int, ts_to: int,
+                       interval: timedelta) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Diffs sorted timestamps of the series against the exchange calendar with sorted set operations
+    :returns (overlap, missing) as holidays with data and sessions from ts_from up to ts_to without data
+    """
+    _, exchange = tool.symbol_split(symbol)
+    overlap = np.intersect1d(timestamps, calendars.exchange_holidays(exchange), assume_unique=True)
+    sessions = calendars.sessions_between(exchange, interval, ts_from, ts_to)
+    missing = np.setdiff1d(sessions, timestamps, assume_unique=True)
     return overlap, missing
 
 
-def security_verify(engine: Any):
+def security_verify(engine: Any, exchanges: Iterable[str] = config.EXCHANGES, resume: bool = False):
     interval = tool.INTERVAL_1D
     source_name = tool.source_name(engine, interval)
     health_name = tool.health_name(engine, interval)
     LOG.info(f'>> {security_verify.__name__} source: {source_name}')
 
-    with engine.SecuritySeries(interval) as security_series:
-        time_range = security_series.time_range()
+    for exchange_name in exchanges:
+        last_session = tool.last_session(exchange_name, interval, DateTime.now())
+        checkpoint = store.Checkpoint(source_name, 'verify', exchange_name, last_session, resume)
+        if exchange_name in checkpoint:
+            continue
 
-    with store.File(health_name, editable=True) as health:
-        for exchange_name in config.EXCHANGES:
+        with store.File(health_name, editable=True) as health:
             health[exchange_name] = {}
-            last_session = tool.last_session(exchange_name, interval, DateTime.now())
+            ts_last_session = last_session.to_timestamp()
 
             with store.ExchangeSeries() as exchange_series:
                 securities = exchange_series[exchange_name]
 
+            with engine.SecuritySeries(interval) as security_series:
+                columns = security_series.bulk_columns(s.symbol for s in securities)
+
             entries = []
-            with flow.Progress(health_name, securities) as progress:
-                for security in securities:
-                    progress(security.symbol)
-
-                    result = Clazz()
-                    symbol_range = time_range.get(security.symbol)
-                    if symbol_range:
-                        overlap, missing = time_series_verify(engine,
-                                                              security.symbol,
-                                                              symbol_range.dt_from,
-                                                              last_session,
-                                                              interval)
-                        if overlap:
-                            result.overlap = overlap
-                        if missing:
-                            result.missing = missing
-                            if len(missing) > config.HEALTH_MISSING_LIMIT:
-                                result.message = f'The missing limit reached: {len(missing)}'
-                        if last_session in missing:
-                            result.message = f'The last session {symbol_range.dt_to} < {last_session}'
-                    else:
-                        result.message = 'There is no time series for this symbol'
-
-                    if result:
-                        short_symbol, _ = tool.symbol_split(security.symbol)
-                        health[exchange_name][short_symbol] = result
-
-                    entry = security.entry(health_name)
-                    entry[health_name] = 'message' not in result
-                    entries += [entry]
+            for security in securities:
+                result = Clazz()
+                timestamps = columns[security.symbol]['timestamp']
+                if len(timestamps):
+                    overlap, missing = time_series_verify(security.symbol,
+                                                          timestamps,
+                                                          int(timestamps[0]),
+                                                          ts_last_session,
+                                                          interval)
+                    if len(overlap):
+                        result.overlap = [DateTime.from_timestamp(t) for t in overlap.tolist()]
+                    if len(missing):
+                        result.missing = [DateTime.from_timestamp(t) for t in missing.tolist()]
+                        if len(missing) > config.HEALTH_MISSING_LIMIT:
+                            result.message = f'The missing limit reached: {len(missing)}'
+                        if missing[-1] == ts_last_session:
+                            dt_to = DateTime.from_timestamp(int(timestamps[-1]))
+                            result.message = f'The last session {dt_to} < {last_session}'
+                else:
+                    result.message = 'There is no time series for this symbol'
+
+                if result:
+                    short_symbol, _ = tool.symbol_split(security.symbol)
+                    health[exchange_name][short_symbol] = result
+
+                entry = security.entry(health_name)
+                entry[health_name] = 'message' not in result
+                entries += [entry]
 
             with store.ExchangeSeries(editable=True) as exchange_series:
                 exchange_series |= entries
 
-            LOG.info(f'Securities: {len(securities)} verified in the exchange: {exchange_name}')
+        checkpoint += [exchange_name]  # the exchange is the item of the stage
+        LOG.info(f'Securities: {len(securities)} verified in the exchange: {exchange_name}')
 
 
-def security_clean(engine: Any):
+def security_clean(engine: Any, exchanges: Iterable[str] = config.EXCHANGES):
     interval = tool.INTERVAL_1D
     source_name = tool.source_name(engine, interval)
     LOG.info(f'>> {security_clean.__name__} source: {source_name}')
 
-    for exchange_name in config.EXCHANGES:
+    for exchange_name in exchanges:
         with store.ExchangeSeries() as exchange_series:
             securities = exchange_series[exchange_name]
 
-        with flow.Progress(f'security-clean {exchange_name}', securities) as progress:
-            for security in securities:
-                progress(security.symbol)
-                with engine.SecuritySeries(interval, editable=True) as security_series:
-                    time_series = security_series[security.symbol]
+        with engine.SecuritySeries(interval, editable=True) as security_series:
+            with flow.Progress(f'security-clean {exchange_name}', securities) as progress:
+                for symbol, time_series in security_series.bulk(s.symbol for s in securities):
+                    progress(symbol)
                     analyse.clean(time_series)
                     security_series *= time_series
 
         LOG.info(f'Securities: {len(securities)} cleaned in the exchange: {exchange_name}')
 
 
-def security_analyse(engine: Any):
+def analyse_state(rolling: store.File, symbol: str) -> Optional[Clazz]:
+    state = rolling.get(symbol)
+    if state and state.get('swings') and state.get('action'):
+        return Clazz(state)
+    return None
+
+
+def security_analyse(engine: Any, exchanges: Iterable[str] = config.EXCHANGES, resume: bool = False):
     interval = tool.INTERVAL_1D
     w_sizes = [50, 100, 200]
+    indicator_names = [f'{n}-{w}' for n in ('sma', 'vma') for w in w_sizes]
     source_name = tool.source_name(engine, interval)
     result_name = tool.result_name(engine, interval, tool.ENV_TEST)
     LOG.info(f'>> {security_analyse.__name__} source: {source_name}')
 
-    for exchange_name in config.EXCHANGES:
+    for exchange_name in exchanges:
         with store.ExchangeSeries() as exchange_series:
             securities = exchange_series[exchange_name]
 
-        entries = []
-        with flow.Progress(f'security-analyse {exchange_name}', securities) as progress:
-            for security in securities:
-                progress(security.symbol)
+        last_session = tool.last_session(exchange_name, interval, DateTime.now())
+        checkpoint = store.Checkpoint(source_name, 'analyse', exchange_name, last_session, resume)
+        securities = [s for s in securities if s.symbol not in checkpoint]
+
+        written = skipped = extended = 0
+        with store.File(tool.rolling_name(engine, interval, exchange_name), editable=True) as rolling:
+            with flow.Progress(f'security-analyse {exchange_name}', securities) as progress:
+                # every chunk is committed before its symbols are checkpointed
+                for chunk_begin in range(0, len(securities), CHECKPOINT_SIZE):
+                    entries = []
+                    exchange_securities = {s.symbol: s for s in securities[chunk_begin:chunk_begin + CHECKPOINT_SIZE]}
+                    states = {s: analyse_state(rolling, s) for s in exchange_securities}
+                    ts_froms = {s: analyse.state_from(state) for s, state in states.items() if state}
+                    with engine.SecuritySeries(interval, editable=True) as security_series:
+                        counts = security_series.counts(exchange_securities)
+                        for symbol, time_series in security_series.bulk(exchange_securities, ts_froms=ts_froms):
+                            progress(symbol)
+
+                            state = states[symbol]
+                            begin = analyse.rolling_split(time_series, state,
+                                                          counts.get(symbol, 0) - len(time_series))
+                            if state and not begin:
+                                time_series = security_series[symbol]  # the history has been rewritten
+                                state = None
+
+                            loaded = time_series[:]  # clean() replaces every datum so the loaded ones stay intact
+                            if state:
+                                extended += 1
+                                analyse.clean(time_series, *indicator_names)
+                            else:
+                                analyse.clean(time_series)
+
+                            rolling_state = analyse.rolling(time_series[begin:], state, w_sizes)
+                            swings_state = swings.calculate(time_series, state.swings if state else None)
+                            checkpoint_state = None
+                            if rolling_state:
+                                rolling_state.swings = swings_state
+                                checkpoint_state = analyse.state_from(rolling_state)
+                            action, action_state = analyse.action(time_series,
+                                                                  state.action if state else None,
+                                                                  checkpoint_state)
+                            if rolling_state:
+                                rolling_state.action = action_state
+                            rolling[symbol] = rolling_state
+
+                            changes = analyse.delta(loaded, time_series)
+                            security_series |= changes
+                            written += len(changes)
+                            skipped += len(time_series) - len(changes)
+
+                            entry = exchange_securities[symbol].entry(result_name)
+                            entry[result_name] = action
+                            entries += [entry]
+                    rolling.flush()
+
+                    with store.ExchangeSeries(editable=True) as exchange_series:
+                        exchange_series |= entries
+                    checkpoint += exchange_securities
+
+        LOG.info(f'Securities: {extended} extended, {len(securities) - extended} recomputed'
+                 f' in the exchange: {exchange_name}')
+        LOG.info(f'Documents: {written} written, {skipped} skipped in the exchange: {exchange_name}')
+        LOG.info(f'Securities: {len(securities)} analysed in the exchange: {exchange_name}')
 
-                with engine.SecuritySeries(interval, editable=True) as security_series:
-                    time_series = security_series[security.symbol]
-                    analyse.clean(time_series)
-                    swings.calculate(time_series)
-                    for w_size in w_sizes:
-                        analyse.sma(time_series, w_size)
-                        analyse.vma(time_series, w_size)
-                    action = analyse.action(time_series)
-                    security_series *= time_series
 
-                    entry = security.entry(result_name)
-                    entry[result_name] = action
-                    entries += [entry]
+def security_panel(engine: Any, exchanges: Iterable[str] = config.EXCHANGES):
+    interval = tool.INTERVAL_1D
+    source_name = tool.source_name(engine, interval)
+    LOG.info(f'>> {security_panel.__name__} source: {source_name}')
 
-        with store.ExchangeSeries(editable=True) as exchange_series:
-            exchange_series |= entries
+    for exchange_name in exchanges:
+        with store.ExchangeSeries() as exchange_series:
+            securities = exchange_series[exchange_name]
 
-        LOG.info(f'Securities: {len(securities)} analysed in the exchange: {exchange_name}')
+        with engine.SecuritySeries(interval) as security_series:
+            exchange_panel = panel.Panel(security_series.name, exchange_name)
+            exchange_panel.update(security_series, [s.symbol for s in securities], interval)
+
+        LOG.info(f'Sessions: {exchange_panel.count} of securities: {len(exchange_panel.symbols)}'
+                 f' in the panel of the exchange: {exchange_name}')
 
 
 @tool.catch_exception(LOG)
-def security_daily(engine: Any):
-    security_update(engine)
-    security_verify(engine)
-    security_analyse(engine)
+def security_daily(engine: Any, resume: bool = False):
+    security_update(engine, resume=resume)
+    security_verify(engine, resume=resume)
+    security_analyse(engine, resume=resume)
+    security_panel(engine)
 
 
 def main():
@@ -2,16 +2,17 @@ import logging
 from datetime import timedelta
 from typing import List, Dict, Optional
 
-import requests
-
 from src import config, tool, store, session
-from src.clazz import Clazz
+from src.clazz import Clazz, Bar
 from src.tool import DateTime
 
 LOG = logging.getLogger(__name__)
 
 DATA_URL = 'https://api-live.exante.eu/md/3.0'
 TRADE_URL = 'https://api-live.exante.eu/trade/3.0'
+FETCH_WORKERS = 8
+MAX_SIZE = 4096  # data of a single ohlc request
+PLAN_SIZE = MAX_SIZE - 256  # sessions of a request, bars on days missing from the holiday tables fit the rest
 
 
 def datetime_to_exante(dt: DateTime) -> int:
@@ -29,23 +30,23 @@ def interval_to_exante(interval: timedelta):
     }[interval]
 
 
-def datum_from_exante(dt: Dict, symbol: str) -> Optional[Clazz]:
+def datum_from_exante(dt: Dict, symbol: str) -> Optional[Bar]:
     try:
-        return Clazz(symbol=symbol,
-                     timestamp=timestamp_from_exante(dt['timestamp']),
-                     open=float(dt['open']),
-                     close=float(dt['close']),
-                     low=float(dt['low']),
-                     high=float(dt['high']),
-                     volume=int(dt['volume']),
-                     **tool.SECURITY_SCORE_DEFAULT)
+        return Bar(symbol=symbol,
+                   timestamp=timestamp_from_exante(dt['timestamp']),
+                   open=float(dt['open']),
+                   close=float(dt['close']),
+                   low=float(dt['low']),
+                   high=float(dt['high']),
+                   volume=int(dt['volume']),
+                   **tool.SECURITY_SCORE_DEFAULT)
     except:
         return None
 
 
 class Session(session.Session):
     def __init__(self):
-        requests.Session.__init__(self)
+        super().__init__()
         self.auth = config.exante_auth()
 
     def securities(self, exchange: str) -> List[Clazz]:
@@ -61,20 +62,19 @@ class Session(session.Session):
                     short_symbol='ticker')
         return [Clazz({k: item[v] for k, v in keys.items()}) for item in response.json()]
 
-    def series(self, symbol: str, dt_from: DateTime, dt_to: DateTime, interval: timedelta) -> List[Clazz]:
+    def series(self, symbol: str, dt_from: DateTime, dt_to: DateTime, interval: timedelta) -> List[Bar]:
         exante_from = datetime_to_exante(dt_from)
         exante_to = datetime_to_exante(dt_to)
         exante_interval = interval_to_exante(interval)
 
         url = f'{DATA_URL}/ohlc/{tool.url_encode(symbol)}/{exante_interval}'
-        max_size = 4096
-        params = {'from': exante_from, 'to': exante_to, 'size': max_size, 'type': 'trades'}
+        params = {'from': exante_from, 'to': exante_to, 'size': MAX_SIZE, 'type': 'trades'}
         response = self.get(url, params=params)
         if response.status_code == 404:
             return []
         assert response.status_code == 200, f'url: {url} params: {params} reply: {response.text}'
         data = [datum_from_exante(datum, symbol) for datum in response.json()]
-        assert len(data) < max_size
+        assert len(data) < MAX_SIZE
         return list(filter(None, data))
 
     def transactions(self) -> List[Clazz]:
@@ -111,9 +111,9 @@ class Session(session.Session):
 
 
 class SecuritySeries(store.SecuritySeries):
-    def __init__(self, interval: timedelta, editable=False, dt_from: DateTime = None):
+    def __init__(self, interval: timedelta, editable=False, dt_from: DateTime = None, dt_to: DateTime = None):
         name = f'security_{tool.source_name(__name__, interval)}'
-        super().__init__(name, editable, dt_from)
+        super().__init__(name, editable, dt_from, dt_to)
 
 
 def read_shortables() -> Dict[str, bool]:
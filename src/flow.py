@@ -2,9 +2,13 @@ import atexit
 import logging
 import sys
 import threading
-from typing import Union, Sized
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor, FIRST_COMPLETED
+from concurrent.futures import wait as wait_futures
+from typing import Union, Sized, Callable, Iterable, Iterator, Any, Dict
 
-from src import config
+from src.clazz import Clazz
 
 LOG = logging.getLogger(__name__)
 
@@ -30,6 +34,175 @@ def execute(function):
     thread.start()
 
 
+def map_ordered(function: Callable, items: Iterable, workers: int, processes: bool = False) -> Iterator[Any]:
+    """
+    Calls the function for items in a bounded thread pool and yields results in order of items,
+    calls not started yet are cancelled when the consumer stops or a call fails, workers=1 runs in the caller thread.
+    CPU bound functions run in worker processes if processes is set, the function and items have to be picklable.
+    """
+    if workers <= 1:
+        for item in items:
+            yield function(item)
+        return
+
+    if processes:
+        executor = ProcessPoolExecutor(max_workers=workers)
+    else:
+        executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix=function.__name__)
+    with executor:
+        futures = deque()
+        try:
+            for item in items:
+                futures.append(executor.submit(function, item))
+                if len(futures) >= 2 * workers:
+                    yield futures.popleft().result()
+            while futures:
+                yield futures.popleft().result()
+        finally:
+            for future in futures:
+                future.cancel()
+
+
+GRAPH_DONE = 'done'
+GRAPH_FAILED = 'failed'
+GRAPH_SKIPPED = 'skipped'
+
+
+def run_graph(nodes: Dict[str, Clazz], workers: int, caps: Dict[str, int] = None) -> Dict[str, str]:
+    """
+    Runs Clazz(function, after, group) nodes in a thread pool as soon as all the nodes named in after are done,
+    at most caps[group] nodes of a group run at once. Nodes following a failed node are skipped.
+    :returns done, failed or skipped state of every node
+    """
+    caps = caps or {}
+    for name, node in nodes.items():
+        unknown = [a for a in node.get('after', []) if a not in nodes]
+        if unknown:
+            raise ValueError(f'The node {name} follows unknown nodes: {unknown}')
+
+    states = {}
+    running = {}
+    with ThreadPoolExecutor(max_workers=workers, thread_name_prefix=run_graph.__name__) as executor:
+        try:
+            while len(states) < len(nodes):
+                progressed = False
+                groups = [nodes[n].get('group') for n in running.values()]
+                for name, node in nodes.items():
+                    if name in states or name in running.values():
+                        continue
+                    after = [states.get(a) for a in node.get('after', [])]
+                    if any(a in (GRAPH_FAILED, GRAPH_SKIPPED) for a in after):
+                        LOG.warning(f'Node: {name} skipped')
+                        states[name] = GRAPH_SKIPPED
+                        progressed = True
+                    elif all(a == GRAPH_DONE for a in after):
+                        group = node.get('group')
+                        if group in caps and groups.count(group) >= caps[group]:
+                            continue
+                        groups += [group]
+                        running[executor.submit(node.function)] = name
+                        progressed = True
+                if not running:
+                    if not progressed and len(states) < len(nodes):
+                        raise ValueError(f'Nodes have cyclic dependencies: {sorted(set(nodes) - set(states))}')
+                    continue
+
+                done, _ = wait_futures(running, timeout=1.0, return_when=FIRST_COMPLETED)
+                wait(0)
+                for future in done:
+                    name = running.pop(future)
+                    try:
+                        future.result()
+                    except Exception:
+                        LOG.exception(f'Node: {name} failed')
+                        states[name] = GRAPH_FAILED
+                    else:
+                        LOG.info(f'Node: {name} done')
+                        states[name] = GRAPH_DONE
+        finally:
+            for future in running:
+                future.cancel()
+    return states
+
+
+class RateLimiter:
+    """
+    Token bucket which lets rate calls per second through with bursts of up to burst calls
+    and at most in_flight calls at once, rate=0 is unlimited, waiting is interrupted by the shutdown
+    """
+
+    def __init__(self, rate: float, burst: int = 1, in_flight: int = 1):
+        self.rate = rate
+        self.burst = burst
+        self.tokens = float(burst)
+        self.since = time.monotonic()
+        self.lock = threading.Lock()
+        self.in_flight = threading.BoundedSemaphore(in_flight)
+
+    def acquire(self):
+        while self.rate:
+            with self.lock:
+                now = time.monotonic()
+                self.tokens = min(self.burst, self.tokens + (now - self.since) * self.rate)
+                self.since = now
+                if self.tokens >= 1.0:
+                    self.tokens -= 1.0
+                    return
+                delay = (1.0 - self.tokens) / self.rate
+            wait(delay)
+
+    def __enter__(self) -> 'RateLimiter':
+        while not self.in_flight.acquire(timeout=0.1):
+            wait(0)
+        try:
+            self.acquire()
+        except:
+            self.in_flight.release()
+            raise
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.in_flight.release()
+
+
+class CircuitOpenError(RuntimeError):
+    pass
+
+
+class CircuitBreaker:
+    """
+    Opens after threshold consecutive failures so calls fail fast instead of waiting for a provider which is down,
+    after timeout seconds one trial call is let through and its success closes the circuit again
+    """
+
+    def __init__(self, name: str, threshold: int, timeout: float):
+        self.name = name
+        self.threshold = threshold
+        self.timeout = timeout
+        self.failures = 0
+        self.opened = 0.0
+        self.lock = threading.Lock()
+
+    def check(self):
+        with self.lock:
+            if self.failures >= self.threshold:
+                if time.monotonic() - self.opened < self.timeout:
+                    raise CircuitOpenError(f'The circuit of {self.name} is open after {self.failures} failures')
+                self.opened = time.monotonic()  # the half-open trial, others fail fast until it is done
+
+    def succeed(self):
+        with self.lock:
+            self.failures = 0
+
+    def fail(self):
+        with self.lock:
+            self.failures += 1
+            if self.failures == self.threshold:
+                LOG.warning(f'The circuit of {self.name} opened for {self.timeout}s')
+            if self.failures >= self.threshold:
+                self.opened = time.monotonic()
+
+
 class Progress:
     def __init__(self, title: str, size: Union[int, Sized]):
         self.count = 0
@@ -54,7 +227,7 @@ class Progress:
     def __call__(self, message: str):
         self.print(f'{self.title}: {100 * self.count / self.length:.1f}% {message}', False)
         self.count += 1
-        wait(config.loop_delay())
+        wait(0)  # requests are throttled by the session rate limiter, only the shutdown is checked here
 
     def print(self, message: str, new_line=True):
         spaces = ''
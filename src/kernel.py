@@ -0,0 +1,140 @@
+import numpy as np
+
+try:
+    import numba
+except ImportError:
+    numba = None
+
+ENABLED = numba is not None  # compiled kernels are used by default if numba is installed
+
+LOW_SCORE, HIGH_SCORE, VALID_LOW_SCORE, VALID_HIGH_SCORE = range(4)
+ACTION_NONE, ACTION_OPEN, ACTION_CLOSE = range(3)
+
+
+def jit(function):
+    """Compiles the kernel if numba is installed, otherwise it runs as the plain python function"""
+    if numba:
+        return numba.njit(cache=True)(function)
+    return function
+
+
+@jit
+def cascade_push(level: int, index: int, value: float,
+                 scores: np.ndarray, ratios: np.ndarray,
+                 queue_size: np.ndarray, queue_index: np.ndarray, queue_value: np.ndarray,
+                 results: np.ndarray):
+    """The array version of swings.Cascade.push()"""
+    while level < len(scores):
+        size = queue_size[level]
+        if size < 2:
+            queue_index[level, size] = index
+            queue_value[level, size] = value
+            queue_size[level] = size + 1
+            if size == 1:
+                return
+        else:
+            score = scores[level]
+            value1 = queue_value[level, 0]
+            index2 = queue_index[level, 1]
+            value2 = queue_value[level, 1]
+            limit = ratios[level] * value2
+
+            if value2 < value1:
+                if value < value2:
+                    results[LOW_SCORE, index] = max(results[LOW_SCORE, index], score)
+                    queue_index[level, 1] = index
+                    queue_value[level, 1] = value
+                    return
+                elif value > value2 + limit:
+                    results[VALID_LOW_SCORE, index2] = max(results[VALID_LOW_SCORE, index2], score)
+                    results[HIGH_SCORE, index] = max(results[HIGH_SCORE, index], score)
+                else:
+                    return
+            elif value2 > value1:
+                if value > value2:
+                    results[HIGH_SCORE, index] = max(results[HIGH_SCORE, index], score)
+                    queue_index[level, 1] = index
+                    queue_value[level, 1] = value
+                    return
+                elif value < value2 - limit:
+                    results[VALID_HIGH_SCORE, index2] = max(results[VALID_HIGH_SCORE, index2], score)
+                    results[LOW_SCORE, index] = max(results[LOW_SCORE, index], score)
+                else:
+                    return
+            else:
+                return
+
+            queue_index[level, 0] = index2
+            queue_value[level, 0] = value2
+            queue_index[level, 1] = index
+            queue_value[level, 1] = value
+            index = index2
+            value = value2
+        level += 1
+
+
+@jit
+def cascade_extend(indexes: np.ndarray, values: np.ndarray,
+                   scores: np.ndarray, ratios: np.ndarray,
+                   queue_size: np.ndarray, queue_index: np.ndarray, queue_value: np.ndarray,
+                   results: np.ndarray):
+    for i in range(len(indexes)):
+        cascade_push(0, indexes[i], values[i], scores, ratios, queue_size, queue_index, queue_value, results)
+
+
+@jit
+def cascade_flush(scores: np.ndarray, ratios: np.ndarray,
+                  queue_size: np.ndarray, queue_index: np.ndarray, queue_value: np.ndarray,
+                  results: np.ndarray):
+    for level in range(len(scores) - 1):
+        if queue_size[level] == 2:
+            cascade_push(level + 1, queue_index[level, 1], queue_value[level, 1],
+                         scores, ratios, queue_size, queue_index, queue_value, results)
+
+
+@jit
+def action(timestamps: np.ndarray, low_scores: np.ndarray, closes: np.ndarray,
+           state: np.ndarray, checkpoint: int,
+           kinds: np.ndarray, open_timestamps: np.ndarray, open_longs: np.ndarray) -> np.ndarray:
+    """
+    The array version of the analyse.action() loop, state is (timestamp, profit, total, long, open_timestamp, volume).
+    Kinds, open timestamps and open longs of every datum are written to the output arrays.
+    :returns the final state followed by the state at the checkpoint, the checkpoint timestamp is -1 if not reached
+    """
+    profit, total, long, open_timestamp, volume = state[1], state[2], state[3], int(state[4]), int(state[5])
+    result = np.zeros(12)
+    result[6] = -1.0
+
+    for i in range(len(timestamps)):
+        if timestamps[i] < state[0]:
+            continue
+        if checkpoint >= 0 and result[6] < 0 and checkpoint <= timestamps[i]:
+            result[6] = timestamps[i]
+            result[7] = profit
+            result[8] = total
+            result[9] = long
+            result[10] = open_timestamp
+            result[11] = volume
+
+        if (long == 0.0) and (4 <= low_scores[i]):
+            open_timestamp = timestamps[i]
+            long = closes[i]
+            kinds[i] = ACTION_OPEN
+
+            total += long
+            volume += 1
+
+        elif (long > 0.0) and (2 <= low_scores[i]):
+            kinds[i] = ACTION_CLOSE
+            open_timestamps[i] = open_timestamp
+            open_longs[i] = long
+            long = 0.0
+
+            profit += closes[i] - open_longs[i]
+
+    result[1] = profit
+    result[2] = total
+    result[3] = long
+    result[4] = open_timestamp
+    result[5] = volume
+    return result
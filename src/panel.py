@@ -0,0 +1,164 @@
+import logging
+import shutil
+from datetime import timedelta
+from pathlib import Path
+from typing import Iterable, List, Optional, Dict
+
+import numpy as np
+import orjson as json
+
+from src import config, tool, calendars
+
+LOG = logging.getLogger(__name__)
+
+PANEL_FIELDS = ('open', 'high', 'low', 'close', 'volume')
+
+
+def has_calendar(interval: timedelta) -> bool:
+    return interval == tool.INTERVAL_1D
+
+
+def session_calendar(exchange: str, interval: timedelta, ts_from: int, ts_to: int) -> Optional[np.ndarray]:
+    """Daily sessions are working days without exchange holidays, other intervals have no calendar"""
+    if not has_calendar(interval):
+        return None
+    return calendars.sessions_between(exchange, interval, ts_from - ts_from % calendars.DAY, ts_to)
+
+
+def align(sessions: np.ndarray, columns: np.ndarray) -> Dict[str, np.ndarray]:
+    """Places the symbol columns into session rows, sessions without a datum are NaN and data off the sessions dropped"""
+    index = np.searchsorted(sessions, columns['timestamp'])
+    found = index < len(sessions)
+    found[found] = sessions[index[found]] == columns['timestamp'][found]
+    results = {}
+    for field in PANEL_FIELDS:
+        values = np.full(len(sessions), np.nan)
+        values[index[found]] = columns[field][found]
+        results[field] = values
+    return results
+
+
+class Panel:
+    """
+    All symbols of an exchange aligned on sessions kept in the store folder,
+    every field is a memory-mapped (sessions x symbols) float matrix of which new sessions are appended as rows.
+    The timestamp file holds sessions of the rows and the meta file the symbols of the columns and the row count.
+    """
+
+    def __init__(self, name: str, exchange: str, path: Path = None):
+        self.name = name
+        self.exchange = exchange
+        self.path = (path or config.STORE_PATH).joinpath('panel', name, exchange)
+        self.symbols: List[str] = []
+        self.count = 0
+
+    def field_path(self, field: str) -> Path:
+        suffix = 'i8' if field == 'timestamp' else 'f8'
+        return self.path.joinpath(f'{field}.{suffix}')
+
+    def load(self) -> 'Panel':
+        meta_path = self.path.joinpath('meta.json')
+        if meta_path.exists():
+            meta = json.loads(meta_path.read_bytes())
+            self.symbols, self.count = meta['symbols'], meta['count']
+        return self
+
+    def save(self):
+        meta_path = self.path.joinpath('meta.json')
+        meta_path_pending = meta_path.with_suffix('.pending')
+        meta_path_pending.write_bytes(json.dumps(dict(symbols=self.symbols, count=self.count)))
+        meta_path_pending.replace(meta_path)
+
+    @property
+    def sessions(self) -> np.ndarray:
+        if not self.count:
+            return np.empty(0, dtype=np.int64)
+        return np.memmap(self.field_path('timestamp'), dtype=np.int64, mode='r', shape=(self.count,))
+
+    def __getitem__(self, field: str) -> np.ndarray:
+        if not self.count:
+            return np.empty((0, len(self.symbols)))
+        return np.memmap(self.field_path(field), dtype=np.float64, mode='r', shape=(self.count, len(self.symbols)))
+
+    def column(self, symbol: str) -> int:
+        return self.symbols.index(symbol)
+
+    def append(self, sessions: np.ndarray, rows: Dict[str, np.ndarray]):
+        """Appends rows of new sessions, bytes written behind the saved count by an interrupted append are dropped"""
+        self.path.mkdir(parents=True, exist_ok=True)
+        for field, values in [('timestamp', sessions)] + [(f, rows[f]) for f in PANEL_FIELDS]:
+            with self.field_path(field).open('ab') as write_io:
+                write_io.truncate(self.count * values.itemsize * (1 if values.ndim == 1 else len(self.symbols)))
+                write_io.write(np.ascontiguousarray(values).tobytes())
+        self.count += len(sessions)
+        self.save()
+
+    def late_row(self, columns: Dict[str, np.ndarray], calendar: bool) -> int:
+        """
+        The first row of a session which has got a bar of some symbol after the row has been appended,
+        panels without a calendar also get rows of new timestamps preceding the last session
+        """
+        sessions = self.sessions
+        missing = np.isnan(self['close'])
+        row = self.count
+        for j, symbol in enumerate(self.symbols):
+            timestamps = columns[symbol]['timestamp']
+            timestamps = timestamps[timestamps <= sessions[-1]]
+            index = np.searchsorted(sessions, timestamps)
+            found = sessions[index] == timestamps
+            late = index[found][missing[index[found], j]]
+            if not calendar:
+                late = np.concatenate([late, index[~found]])
+            if len(late):
+                row = min(row, int(late.min()))
+        return row
+
+    def update(self, security_series, symbols: Iterable[str], interval: timedelta):
+        """
+        Builds the panel from the series columns or appends sessions following the last one,
+        rows from the first session with a late bar are rebuilt and
+        the whole panel is rebuilt when the symbols of the exchange have changed
+        """
+        self.load()
+        symbols = sorted(set(symbols))
+        if symbols != self.symbols:
+            self.erase()
+            self.symbols = symbols
+
+        calendar = has_calendar(interval)
+        columns = {s: security_series.columns(s) for s in symbols}
+        ts_from = None
+        if self.count:
+            row = self.late_row(columns, calendar)
+            if row:
+                ts_from = int(self.sessions[row - 1]) + 1  # rows from the late one on are rebuilt
+                columns = {s: c[c['timestamp'] >= ts_from] for s, c in columns.items()}
+            if row < self.count:
+                LOG.debug(f'Sessions: {self.count - row} rebuilt with late bars in the panel {self.name}')
+                self.count = row
+                self.save()  # an interrupted rebuild leaves the shorter panel
+
+        timestamps = np.concatenate([c['timestamp'] for c in columns.values()] + [np.empty(0, dtype=np.int64)])
+        if not len(timestamps):
+            return
+        if ts_from is None:
+            ts_from = int(timestamps.min())
+        if calendar:
+            # sessions without any bar follow the last one too
+            sessions = session_calendar(self.exchange, interval, ts_from, int(timestamps.max()))
+            sessions = sessions[sessions >= ts_from]
+        else:
+            sessions = np.unique(timestamps)
+
+        rows = {f: np.full((len(sessions), len(symbols)), np.nan) for f in PANEL_FIELDS}
+        for j, symbol in enumerate(symbols):
+            for field, values in align(sessions, columns[symbol]).items():
+                rows[field][:, j] = values
+        self.append(sessions, rows)
+        LOG.debug(f'Sessions: {len(sessions)} appended to the panel {self.name} {self.exchange}')
+
+    def erase(self):
+        if self.path.exists():
+            LOG.info(f'Erasing panel: {self.path.as_posix()}')
+            shutil.rmtree(self.path)
+        self.symbols, self.count = [], 0
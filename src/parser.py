@@ -0,0 +1,79 @@
+import logging
+from io import BytesIO
+from typing import Dict, List, Tuple
+
+import numpy as np
+import pandas as pd
+
+from src import cache
+from src.clazz import Bar
+
+LOG = logging.getLogger(__name__)
+
+OHLC_FIELDS = ('timestamp', 'open', 'high', 'low', 'close', 'volume')
+STOOQ_COLUMNS = dict(zip(OHLC_FIELDS, ('<DATE>', '<OPEN>', '<HIGH>', '<LOW>', '<CLOSE>', '<VOL>')))
+STOOQ_DATE_FORMAT = '%Y%m%d'
+YAHOO_COLUMNS = dict(zip(OHLC_FIELDS, ('Date', 'Open', 'High', 'Low', 'Close', 'Volume')))
+YAHOO_DATE_FORMAT = '%Y-%m-%d'
+
+
+def timestamps_from_days(days: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Converts YYYYMMDD integers to timestamps of midnight UTC with the date arithmetic on whole arrays
+    :returns (timestamps, valid) where invalid dates like 20200230 are marked
+    """
+    years, months, days = days // 10000, days // 100 % 100, days % 100
+    valid = (1 <= months) & (months <= 12) & (1 <= days) & (days <= 31)
+    months = np.where(valid, (years - 1970) * 12 + months - 1, 0).astype('datetime64[M]')
+    dates = months.astype('datetime64[D]') + np.where(valid, days - 1, 0).astype('timedelta64[D]')
+    valid &= dates.astype('datetime64[M]') == months  # the day overflowed to the next month
+    return dates.astype('datetime64[s]').astype(np.int64), valid
+
+
+def timestamps_from_dates(dates: pd.Series, date_format: str) -> Tuple[np.ndarray, np.ndarray]:
+    if pd.api.types.is_numeric_dtype(dates) and date_format == STOOQ_DATE_FORMAT:
+        return timestamps_from_days(dates.fillna(0).to_numpy(dtype=np.int64))  # blank rows make days floats
+    parsed = pd.to_datetime(dates.astype(str), format=date_format, errors='coerce')
+    valid = parsed.notna().to_numpy()
+    timestamps = parsed.to_numpy(dtype='datetime64[s]', na_value=np.datetime64(0, 's')).astype(np.int64)
+    return timestamps, valid
+
+
+def parse_ohlc(content: bytes, columns: Dict[str, str], date_format: str) -> Tuple[np.ndarray, List[int]]:
+    """
+    Parses the whole csv file into typed (timestamp, open, high, low, close, volume) columns,
+    malformed rows with a missing or non numeric value or an invalid date are dropped,
+    a body which is not the expected csv like an html error page is malformed as a whole.
+    :returns columns in file order and line numbers of the malformed rows
+    """
+    if not content.strip():
+        return np.empty(0, dtype=cache.BAR_DTYPE), []
+    try:
+        frame = pd.read_csv(BytesIO(content), usecols=list(columns.values()), skipinitialspace=True,
+                            skip_blank_lines=False)  # blank lines are malformed rows so rows stay file lines
+    except ValueError:  # missing columns, parser and empty data errors are value errors
+        return np.empty(0, dtype=cache.BAR_DTYPE), list(range(1, len(content.strip().splitlines()) + 1))
+
+    timestamps, valid = timestamps_from_dates(frame[columns['timestamp']], date_format)
+    values = {}
+    for field in OHLC_FIELDS[1:]:
+        values[field] = pd.to_numeric(frame[columns[field]], errors='coerce').to_numpy(dtype=np.float64,
+                                                                                        na_value=np.nan)
+        valid = valid & ~np.isnan(values[field])
+
+    result = np.empty(int(valid.sum()), dtype=cache.BAR_DTYPE)
+    result['timestamp'] = timestamps[valid]
+    for field, field_values in values.items():
+        result[field] = field_values[valid]
+    malformed = (np.flatnonzero(~valid) + 2).tolist()  # the header is the first line
+    return result, malformed
+
+
+def report_malformed(source: str, malformed: List[int]):
+    if malformed:
+        LOG.warning(f'Rows: {len(malformed)} malformed dropped in {source} lines: {malformed[:10]}')
+
+
+def to_series(symbol: str, columns: np.ndarray) -> List[Bar]:
+    fields = [columns[f].tolist() for f in ('timestamp', 'open', 'close', 'low', 'high', 'volume')]
+    return [Bar.security(symbol, *values) for values in zip(*fields)]
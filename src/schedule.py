@@ -1,6 +1,8 @@
 import logging
 import sys
 import threading
+from functools import partial
+from typing import Any, Dict, Iterable
 
 import orjson as json
 from flask import Flask, request
@@ -19,11 +21,39 @@ def wsgi(environ, start_response):
     return app(environ, start_response)
 
 
+DAILY_WORKERS = 8
+DAILY_CAPS = {'yahoo': 2, 'stooq': 1, 'exante': 2}  # updates of a provider running at once
+
+
+def daily_graph(engines: Iterable[Any], resume: bool = False) -> Dict[str, Clazz]:
+    """
+    Nodes of the daily task for every engine and exchange, the analyse follows the verify following the update
+    and the panel follows the update, updates of an engine are grouped under the engine name.
+    Resumed stages skip symbols of their checkpoints.
+    """
+    nodes = {'exchange-update': Clazz(function=partial(data.exchange_update, resume=resume), after=[])}
+    for engine in engines:
+        engine_name = engine.__name__.split('.')[-1]
+        for exchange_name in config.EXCHANGES:
+            name = f'{engine_name}-{exchange_name}'
+            nodes[f'{name}-update'] = Clazz(function=partial(data.security_update, engine, [exchange_name], resume=resume),
+                                            after=['exchange-update'],
+                                            group=engine_name)
+            nodes[f'{name}-verify'] = Clazz(function=partial(data.security_verify, engine, [exchange_name], resume=resume),
+                                            after=[f'{name}-update'])
+            nodes[f'{name}-analyse'] = Clazz(function=partial(data.security_analyse, engine, [exchange_name], resume=resume),
+                                             after=[f'{name}-verify'])
+            nodes[f'{name}-panel'] = Clazz(function=partial(data.security_panel, engine, [exchange_name]),
+                                           after=[f'{name}-update'])
+    return nodes
+
+
 @tool.catch_exception(LOG)
-def task_daily():
-    data.exchange_update()
-    for engine in (yahoo, stooq, exante):
-        data.security_daily(engine)
+def task_daily(resume: bool = False):
+    states = flow.run_graph(daily_graph((yahoo, stooq, exante), resume), DAILY_WORKERS, DAILY_CAPS)
+    failed = sorted(n for n, state in states.items() if state != flow.GRAPH_DONE)
+    if failed:
+        LOG.warning(f'Nodes: {len(failed)} of the daily task failed or skipped: {failed}')
 
 
 TASKS = [
@@ -10,7 +10,8 @@ CONFIG_SCHEMA = {
                 'quandl': {'$ref': '#/definitions/Quandl'},
                 'iex': {'$ref': '#/definitions/IEX'},
                 'notify-run': {'$ref': '#/definitions/NotifyRun'},
-                'arango-db': {'$ref': '#/definitions/ArangoDB'}
+                'arango-db': {'$ref': '#/definitions/ArangoDB'},
+                'rate-limit': {'$ref': '#/definitions/RateLimits'}
             },
             'required': ['system', 'exante', 'quandl', 'iex', 'notify-run', 'arango-db']
         },
@@ -64,9 +65,23 @@ CONFIG_SCHEMA = {
                 'url': {'type': 'string', 'format': 'uri'},
                 'username': {'type': 'string'},
                 'password': {'type': 'string'},
-                'database': {'type': 'string'}
+                'database': {'type': 'string'},
+                'pool-size': {'type': 'integer', 'minimum': 1}
             },
             'required': ['url', 'username', 'password', 'database']
+        },
+        'RateLimits': {
+            'type': 'object',
+            'additionalProperties': {'$ref': '#/definitions/RateLimit'}
+        },
+        'RateLimit': {
+            'type': 'object',
+            'additionalProperties': False,
+            'properties': {
+                'rate': {'type': 'number', 'format': 'float', 'minimum': 0},
+                'burst': {'type': 'integer', 'minimum': 1},
+                'in-flight': {'type': 'integer', 'minimum': 1}
+            }
         }
     }
 }
@@ -1,15 +1,114 @@
+import logging
+import random
+import threading
+import time
 from datetime import timedelta
-from typing import List
+from email.utils import parsedate_to_datetime
+from typing import List, Iterable, Iterator, Tuple, Dict, Optional
 
 import requests
 
-from src.clazz import Clazz
+from src import config, flow
+from src.clazz import Bar
 from src.tool import DateTime
 
+LOG = logging.getLogger(__name__)
+
+RETRY_ATTEMPTS = 4
+RETRY_BACKOFF = 1.0
+RETRY_BACKOFF_MAX = 60.0
+RETRY_STATUSES = (429, 500, 502, 503, 504)
+RETRY_METHODS = ('GET', 'HEAD', 'OPTIONS')  # others like placing an order may have been done despite the failure
+BREAKER_THRESHOLD = 8
+BREAKER_TIMEOUT = 300.0
+# limiters and breakers are shared by sessions of the provider which are opened for every exchange at once
+LIMITERS: Dict[str, flow.RateLimiter] = {}
+BREAKERS: Dict[str, flow.CircuitBreaker] = {}
+PROVIDER_LOCK = threading.Lock()
+
+
+def retry_after(response: requests.Response) -> Optional[float]:
+    """:returns seconds of the Retry-After header given either as seconds or as a http date"""
+    value = response.headers.get('Retry-After')
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        try:
+            return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+        except (TypeError, ValueError):
+            return None
+
+
+def backoff(attempt: int) -> float:
+    """Exponential backoff with the full jitter"""
+    return random.uniform(0.0, min(RETRY_BACKOFF_MAX, RETRY_BACKOFF * 2 ** attempt))
+
 
 class Session(requests.Session):
+    """
+    Base of provider sessions, every request waits for the rate limiter configured for the provider module.
+    Connection errors and 429/5xx replies of idempotent requests are retried with backoff, other requests only
+    if the connection has not been made. A provider failing all the time is skipped by its circuit breaker.
+    """
+
     def __init__(self):
         super().__init__()
+        provider = type(self).__module__.split('.')[-1]
+        with PROVIDER_LOCK:
+            if provider not in LIMITERS:
+                LIMITERS[provider] = flow.RateLimiter(*config.rate_limit(provider))
+                BREAKERS[provider] = flow.CircuitBreaker(provider, BREAKER_THRESHOLD, BREAKER_TIMEOUT)
+        self.limiter = LIMITERS[provider]
+        self.breaker = BREAKERS[provider]
+
+    def request(self, method: str, url: str, *args, **kwargs) -> requests.Response:
+        """:returns the first reply which is not retried or the last one after all attempts"""
+        idempotent = method.upper() in RETRY_METHODS
+        attempt = 0
+        while True:
+            self.breaker.check()
+            try:
+                with self.limiter:
+                    response = super().request(method, url, *args, **kwargs)
+            except (requests.exceptions.ConnectionError, requests.exceptions.Timeout) as e:
+                self.breaker.fail()
+                unsent = isinstance(e, requests.exceptions.ConnectTimeout)
+                if attempt + 1 >= RETRY_ATTEMPTS or not (idempotent or unsent):
+                    raise
+                delay = backoff(attempt)
+                LOG.warning(f'Retrying {method} {url} in {delay:.1f}s after the connection failure')
+            else:
+                if response.status_code not in RETRY_STATUSES:
+                    self.breaker.succeed()
+                    return response
+                if response.status_code != 429:
+                    self.breaker.fail()  # a throttling provider is not down
+                if attempt + 1 >= RETRY_ATTEMPTS or not idempotent:
+                    return response
+                delay = retry_after(response)
+                delay = backoff(attempt) if delay is None else min(delay, RETRY_BACKOFF_MAX)
+                LOG.warning(f'Retrying {method} {url} in {delay:.1f}s after the reply {response.status_code}')
+                response.close()
+            flow.wait(delay)
+            attempt += 1
 
-    def series(self, symbol: str, dt_from: DateTime, dt_to: DateTime, interval: timedelta) -> List[Clazz]:
+    def series(self, symbol: str, dt_from: DateTime, dt_to: DateTime, interval: timedelta) -> List[Bar]:
         raise NotImplementedError
+
+    def bulk(self,
+             ranges: Iterable[Tuple[str, DateTime, DateTime]],
+             interval: timedelta,
+             workers: int = 1) -> Iterator[Tuple[str, List[Bar]]]:
+        """
+        Fetches series from dt_from up to dt_to of (symbol, dt_from, dt_to) ranges in a thread pool, one request each,
+        yields (symbol, series) in order of ranges, providers may override it with a faster bulk access.
+        Ranges are planned by calendars.plan_requests within the page size of the provider.
+        """
+
+        def fetch(symbol_range: Tuple[str, DateTime, DateTime]) -> Tuple[str, List[Bar]]:
+            symbol, dt_from, dt_to = symbol_range
+            return symbol, self.series(symbol, dt_from, dt_to, interval)
+
+        return flow.map_ordered(fetch, ranges, workers)
@@ -1,15 +1,18 @@
-import csv
+import hashlib
 import logging
+import os
+import threading
 import zipfile
-from datetime import timezone, timedelta
-from io import StringIO
+from datetime import timedelta
 from pathlib import Path
-from typing import Dict, List, Optional
+from typing import Dict, List, Iterable, Iterator, Tuple
 
+import numpy as np
+import orjson as json
 import requests
 
-from src import tool, config, session, store, flow
-from src.clazz import Clazz
+from src import tool, config, session, store, flow, parser
+from src.clazz import Bar
 from src.tool import DateTime
 
 LOG = logging.getLogger(__name__)
@@ -17,9 +20,12 @@ LOG = logging.getLogger(__name__)
 URL_CHUNK_SIZE = 1024 * 1024
 STOOQ_PATH = Path('/tmp/stooq/')
 
-DT_FORMAT = '%Y%m%d'
 ZIP_URL_FORMAT = 'https://static.stooq.com/db/h/{interval}_{country}_txt.zip'
 ZIP_PATH_FORMAT = 'data-{interval}-{country}.zip'
+MANIFEST_NAME = 'manifest.json'
+MANIFEST_LOCK = threading.Lock()
+FETCH_WORKERS = min(4, os.cpu_count() or 1)  # zip members are parsed in worker processes
+PLAN_SIZE = None  # members are read whole
 
 EXCHANGE_COUNTRY = {
     'NYSE': 'us',
@@ -59,90 +65,204 @@ def stooq_zip_path(interval: timedelta, exchange: str) -> Path:
     return STOOQ_PATH.joinpath(path)
 
 
-def find_symbol_path(short_symbol: str, interval: timedelta, exchange: str, name_list: List[str]) -> Optional[str]:
-    stooq_symbol = short_symbol.replace('.', '-').lower()
+def stooq_symbol(short_symbol: str) -> str:
+    return short_symbol.replace('.', '-').lower()
+
+
+def zip_index(name_list: Iterable[str], interval: timedelta, exchange: str) -> Dict[str, str]:
+    """Maps stooq symbols of the exchange to zip members, a symbol found in several paths is taken from the first one"""
     stooq_interval = {
         tool.INTERVAL_1H: 'hourly',
         tool.INTERVAL_1D: 'daily'
     }[interval]
-    for path in EXCHANGE_PATHS[exchange]:
-        symbol_path = path.format(interval=stooq_interval, symbol=stooq_symbol)
-        if symbol_path in name_list:
-            return symbol_path
-    return None
+    patterns = [p.format(interval=stooq_interval, symbol='\0').split('\0') for p in EXCHANGE_PATHS[exchange]]
+    name_list = list(name_list)
+    index = {}
+    for prefix, suffix in reversed(patterns):
+        for name in name_list:
+            if name.startswith(prefix) and name.endswith(suffix):
+                symbol = name[len(prefix):len(name) - len(suffix)]
+                if symbol and '/' not in symbol:
+                    index[symbol] = name
+    return index
+
+
+def columns_from_stooq(content: bytes, ts_from: int, ts_to: int) -> Tuple[np.ndarray, List[int]]:
+    """Parses the whole member at once into columns of the time range and line numbers of malformed rows"""
+    columns, malformed = parser.parse_ohlc(content, parser.STOOQ_COLUMNS, parser.STOOQ_DATE_FORMAT)
+    timestamps = columns['timestamp']
+    return columns[(ts_from <= timestamps) & (timestamps <= ts_to)], malformed
+
+
+def series_from_stooq(content: bytes, symbol: str, ts_from: int, ts_to: int) -> List[Bar]:
+    columns, malformed = columns_from_stooq(content, ts_from, ts_to)
+    parser.report_malformed(symbol, malformed)
+    return parser.to_series(symbol, columns)
+
+
+def parse_member(member: Tuple[bytes, int, int]) -> Tuple[np.ndarray, List[int]]:
+    """Entry point of parser processes in the bulk import, columns are cheaper to transfer than data"""
+    content, ts_from, ts_to = member
+    return columns_from_stooq(content, ts_from, ts_to)
+
+
+def load_manifest() -> Dict[str, Dict]:
+    manifest_path = STOOQ_PATH.joinpath(MANIFEST_NAME)
+    return json.loads(manifest_path.read_bytes()) if manifest_path.exists() else {}
+
+
+def update_manifest(name: str, **entry):
+    """Merges the entry of the zip into the manifest, the manifest is shared by parallel downloads"""
+    with MANIFEST_LOCK:
+        manifest = load_manifest()
+        manifest[name] = {**manifest.get(name, {}), **entry}
+        manifest_path = STOOQ_PATH.joinpath(MANIFEST_NAME)
+        manifest_path_pending = manifest_path.with_suffix('.pending')
+        manifest_path_pending.write_bytes(json.dumps(manifest, option=json.OPT_INDENT_2))
+        manifest_path_pending.replace(manifest_path)
 
 
-def timestamp_from_stooq(date: str):
-    dt = DateTime.strptime(date, DT_FORMAT)
-    return dt.replace(tzinfo=timezone.utc).to_timestamp()
+def file_checksum(path: Path) -> str:
+    checksum = hashlib.sha256()
+    with path.open('rb') as read_io:
+        for chunk in iter(lambda: read_io.read(URL_CHUNK_SIZE), b''):
+            checksum.update(chunk)
+    return checksum.hexdigest()
 
 
-def datum_from_stooq(dt: Dict, symbol: str) -> Optional[Clazz]:
-    try:
-        return Clazz(symbol=symbol,
-                     timestamp=timestamp_from_stooq(dt['<DATE>']),
-                     open=float(dt['<OPEN>']),
-                     close=float(dt['<CLOSE>']),
-                     low=float(dt['<LOW>']),
-                     high=float(dt['<HIGH>']),
-                     volume=int(dt['<VOL>']),
-                     **tool.SECURITY_SCORE_DEFAULT)
-    except:
-        return None
+def download_zip(http: requests.Session, url: str, zip_path: Path) -> bool:
+    """
+    Downloads the zip unless it is not modified since the manifest entry,
+    a pending file left by an interrupted download is resumed if the remote zip is still the same.
+    :returns True if a new zip has been downloaded
+    """
+    entry = load_manifest().get(zip_path.name, {})
+    zip_path_pending = zip_path.with_suffix('.pending')
+    headers = {}
+
+    # conditional get of the zip matching its checksum
+    if zip_path.exists() and entry.get('sha256') == file_checksum(zip_path):
+        if entry.get('etag'):
+            headers['If-None-Match'] = entry['etag']
+        if entry.get('last-modified'):
+            headers['If-Modified-Since'] = entry['last-modified']
+
+    # range get of the rest of the pending file
+    offset = zip_path_pending.stat().st_size if zip_path_pending.exists() else 0
+    pending = entry.get('pending', {})
+    validator = pending.get('etag') or pending.get('last-modified')
+    if offset and validator:
+        headers['Range'] = f'bytes={offset}-'
+        headers['If-Range'] = validator
+
+    response = http.get(url, headers=headers, stream=True)
+    if response.status_code == 304:
+        LOG.info(f'Not modified {url}')
+        zip_path.touch()  # the zip is the latest one until the next session
+        return False
+    if response.status_code == 416:
+        LOG.warning(f'Restarting the download of {url} from {zip_path_pending.as_posix()} of {offset} bytes')
+        zip_path_pending.unlink()
+        return download_zip(http, url, zip_path)
+    assert response.status_code in (200, 206), f'url: {url} headers: {headers} reply: {response.status_code}'
+
+    if response.status_code == 200:
+        offset = 0
+        update_manifest(zip_path.name, pending={'etag': response.headers.get('ETag'),
+                                                'last-modified': response.headers.get('Last-Modified')})
+        pending = load_manifest()[zip_path.name]['pending']
+    length = int(response.headers['Content-Length'])
+    message = f'Loading {url} to {zip_path.as_posix()}'
+    LOG.info(message + (f' resumed at {offset} bytes' if offset else ''))
+    LOG.debug(f'Size {zip_path.as_posix()}: {(offset + length) / 1024 / 1024:.2f}M')
+
+    # streaming to the pending file
+    with zip_path_pending.open('ab' if offset else 'wb') as zip_io:
+        with flow.Progress(message, -(-length // URL_CHUNK_SIZE)) as progress:
+            for chunk in response.iter_content(URL_CHUNK_SIZE):
+                progress('+')
+                zip_io.write(chunk)
+    size = zip_path_pending.stat().st_size
+    assert size == offset + length, f'url: {url} size: {size} expected: {offset + length}'
+
+    checksum = file_checksum(zip_path_pending)
+    zip_path_pending.replace(zip_path)
+    update_manifest(zip_path.name, url=url, size=size, sha256=checksum, pending={}, **pending)
+    return True
 
 
 class Session(session.Session):
     def __init__(self, exchanges=None):
+        super().__init__()
+        self.zips = {}
         self.exchanges = exchanges if exchanges else {e: [tool.INTERVAL_1D] for e in config.EXCHANGES}
 
+        downloads = {}
         for exchange, intervals in self.exchanges.items():
             for interval in intervals:
                 zip_path = stooq_zip_path(interval, exchange)
                 zip_path.parent.mkdir(parents=True, exist_ok=True)
                 if not tool.is_latest(zip_path, interval, exchange):
+                    downloads[zip_path] = stooq_url(interval, exchange)  # exchanges of a country share the zip
 
-                    # start streaming from url
-                    url = stooq_url(interval, exchange)
-                    response = requests.get(url, stream=True)
-                    message = f'Loading {url} to {zip_path.as_posix()}'
-                    LOG.info(message)
-                    size = int(response.headers["Content-Length"]) // URL_CHUNK_SIZE + 1
-                    LOG.debug(f'Size {zip_path.as_posix()}: {size}M')
-
-                    # streaming to the zip file
-                    zip_path_pending = zip_path.with_suffix('.pending')
-                    with zip_path_pending.open('wb') as zip_io:
-                        with flow.Progress(message, size) as progress:
-                            for chunk in response.iter_content(URL_CHUNK_SIZE):
-                                progress('+')
-                                zip_io.write(chunk)
-                    zip_path_pending.rename(zip_path)
+        def download(item: Tuple[Path, str]) -> bool:
+            zip_path, url = item
+            return download_zip(self, url, zip_path)
+
+        for _ in flow.map_ordered(download, downloads.items(), len(downloads)):
+            pass
 
     def __exit__(self, exc_type, exc_val, exc_tb):
         for exchange, intervals in self.exchanges.items():
             for interval in intervals:
                 zip_path = stooq_zip_path(interval, exchange)
                 LOG.debug(f'zip_path: {zip_path.as_posix()} size: {zip_path.stat().st_size / 1024 / 1024:.2f}M')
+        for zip_io, _ in self.zips.values():
+            zip_io.close()
+        self.zips.clear()
+        super().__exit__(exc_type, exc_val, exc_tb)
+
+    def zip_file(self, interval: timedelta, exchange: str) -> Tuple[zipfile.ZipFile, Dict[str, str]]:
+        """Opens the zip of the exchange once and indexes its members by stooq symbols"""
+        key = (interval, exchange)
+        if key not in self.zips:
+            zip_io = zipfile.ZipFile(stooq_zip_path(interval, exchange))
+            self.zips[key] = zip_io, zip_index(zip_io.namelist(), interval, exchange)
+        return self.zips[key]
 
-    def series(self, symbol: str, dt_from: DateTime, dt_to: DateTime, interval: timedelta) -> List[Clazz]:
+    def series(self, symbol: str, dt_from: DateTime, dt_to: DateTime, interval: timedelta) -> List[Bar]:
         short_symbol, exchange = tool.symbol_split(symbol)
-        ts_from = dt_from.to_timestamp()
-        ts_to = dt_to.to_timestamp()
-        zip_path = stooq_zip_path(interval, exchange)
-        with zipfile.ZipFile(zip_path) as zip_io:
-            relative_path = find_symbol_path(short_symbol, interval, exchange, zip_io.namelist())
-            if relative_path:
-                content = zip_io.read(relative_path).decode('utf-8')
-                data = [datum_from_stooq(dt, symbol) for dt in csv.DictReader(StringIO(content))]
-                return [
-                    datum
-                    for datum in data
-                    if datum and ts_from <= datum.timestamp <= ts_to
-                ]
+        zip_io, index = self.zip_file(interval, exchange)
+        member = index.get(stooq_symbol(short_symbol))
+        if member:
+            return series_from_stooq(zip_io.read(member), symbol, dt_from.to_timestamp(), dt_to.to_timestamp())
         return []
 
+    def bulk(self,
+             ranges: Iterable[Tuple[str, DateTime, DateTime]],
+             interval: timedelta,
+             workers: int = 1) -> Iterator[Tuple[str, List[Bar]]]:
+        """
+        Reads members of all ranges in one pass over the open zip files, series are from dt_from up to dt_to,
+        members are parsed in worker processes if there are more workers
+        """
+        ranges = list(ranges)
+
+        def members() -> Iterator[Tuple[bytes, int, int]]:
+            for symbol, dt_from, dt_to in ranges:
+                short_symbol, exchange = tool.symbol_split(symbol)
+                zip_io, index = self.zip_file(interval, exchange)
+                member = index.get(stooq_symbol(short_symbol))
+                content = zip_io.read(member) if member else b''
+                yield content, dt_from.to_timestamp(), dt_to.to_timestamp()
+
+        results = flow.map_ordered(parse_member, members(), workers, processes=True)
+        for (symbol, _, _), (columns, malformed) in zip(ranges, results):
+            parser.report_malformed(symbol, malformed)
+            yield symbol, parser.to_series(symbol, columns)
+
 
 class SecuritySeries(store.SecuritySeries):
-    def __init__(self, interval: timedelta, editable=False, dt_from: DateTime = None):
+    def __init__(self, interval: timedelta, editable=False, dt_from: DateTime = None, dt_to: DateTime = None):
         name = f'security_{tool.source_name(__name__, interval)}'
-        super().__init__(name, editable, dt_from)
+        super().__init__(name, editable, dt_from, dt_to)
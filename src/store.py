@@ -1,42 +1,147 @@
+import atexit
 import logging
-from typing import List, Tuple, Dict, Any
-
+import threading
+import time
+from collections import defaultdict
+from functools import lru_cache
+from itertools import groupby
+from typing import List, Tuple, Dict, Any, Iterable, Iterator, Optional
+
+import numpy as np
 import orjson as json
+import requests
 from arango import ArangoClient, ArangoServerError
 from arango.database import StandardDatabase
+from arango.http import DefaultHTTPClient
+from requests.adapters import HTTPAdapter
 
-from src import config, tool, schema
-from src.clazz import Clazz
+from src import config, tool, schema, cache, panel
+from src.clazz import Clazz, Bar
 from src.tool import DateTime
 
 LOG = logging.getLogger(__name__)
 
+BATCH_SIZE = 10000
+BUFFER_COUNT = 50000
+BUFFER_BYTES = 32 * 1024 * 1024
+BUFFER_DELAY = 60.0
+
+OVERWRITE_CONFLICT = 'conflict'
+OVERWRITE_REPLACE = 'replace'
+OVERWRITE_UPDATE = 'update'
+OVERWRITE_IGNORE = 'ignore'
+SECURITY_UNIQUE_FIELDS = ('symbol', 'timestamp')
+TIMESTAMP_MAX = 2 ** 53
+
+
+FILE_LOCKS = defaultdict(threading.Lock)
+
 
 class File(dict):
+    """
+    Json file of the store folder, keys set while it is open are merged into the file on exit
+    so files opened at once by tasks of different exchanges keep changes of each other
+    """
+
     def __init__(self, name: str, editable=False):
         super().__init__()
         self.editable = editable
         self.filename = config.STORE_PATH.joinpath(f'{name}.json')
+        self.changed = set()
+        self.version = None
 
     def __enter__(self) -> 'File':
-        if self.filename.exists():
-            with self.filename.open() as read_io:
-                self.update(json.loads(read_io.read()))
+        with FILE_LOCKS[self.filename]:
+            if self.filename.exists():
+                with self.filename.open() as read_io:
+                    self.update(json.loads(read_io.read()))
+            self.version = self.file_version()
         return self
 
     def __exit__(self, exc_type, exc_val, exc_tb):
         if self.editable and not exc_type:
-            with self.filename.open('wb') as write_io:
-                write_io.write(json.dumps(self, option=json.OPT_INDENT_2, default=tool.json_default))
+            self.flush()
+
+    def file_version(self) -> Optional[Tuple[int, int]]:
+        if not self.filename.exists():
+            return None
+        stat = self.filename.stat()
+        return stat.st_mtime_ns, stat.st_size
+
+    def flush(self):
+        """Writes the changed keys, the file is read again to merge them only if it has been written by others"""
+        if not self.changed:
+            return
+        with FILE_LOCKS[self.filename]:
+            if self.file_version() != self.version:
+                content = json.loads(self.filename.read_bytes()) if self.filename.exists() else {}
+                content.update({k: self[k] for k in self.changed})
+                super().update(content)
+            filename_pending = self.filename.with_suffix('.pending')
+            filename_pending.write_bytes(json.dumps(dict(self), option=json.OPT_INDENT_2, default=tool.json_default))
+            filename_pending.replace(self.filename)
+            self.version = self.file_version()
+            self.changed = set()
 
     def __setitem__(self, key: str, value: Any):
         assert self.editable
         super().__setitem__(key, value)
+        self.changed.add(key)
+
+
+class Checkpoint:
+    """
+    Symbols done by a stage for an exchange in its last session kept in a store file,
+    a resumed run skips them while a new session or a run without resume starts over
+    """
+
+    def __init__(self, source: str, stage: str, exchange: str, session: DateTime, resume: bool):
+        self.name = f'checkpoint_{source}'
+        self.key = f'{stage}-{exchange}'
+        self.session = session.to_timestamp()
+        self.symbols = set()
+        if resume:
+            with File(self.name) as checkpoint:
+                entry = checkpoint.get(self.key)
+                if entry and entry['session'] == self.session:
+                    self.symbols = set(entry['symbols'])
+        if self.symbols:
+            LOG.info(f'Checkpoint: {len(self.symbols)} symbols of {self.key} {source} resumed')
+
+    def __contains__(self, symbol: str) -> bool:
+        return symbol in self.symbols
+
+    def __iadd__(self, symbols: Iterable[str]) -> 'Checkpoint':
+        """Symbols are added once their results are committed"""
+        symbols = set(symbols) - self.symbols
+        if symbols:
+            self.symbols |= symbols
+            with File(self.name, editable=True) as checkpoint:
+                checkpoint[self.key] = dict(session=self.session, symbols=sorted(self.symbols))
+        return self
+
 
+class PooledHTTPClient(DefaultHTTPClient):
+    """The default client of which adapters keep the retry strategy and have the connection pool of pool_size"""
 
+    def __init__(self, pool_size: int):
+        super().__init__()
+        self.pool_size = pool_size
+
+    def create_session(self, host: str) -> requests.Session:
+        session = super().create_session(host)
+        for prefix, adapter in list(session.adapters.items()):
+            session.mount(prefix, HTTPAdapter(pool_connections=self.pool_size,
+                                              pool_maxsize=self.pool_size,
+                                              max_retries=adapter.max_retries))
+        return session
+
+
+@lru_cache(maxsize=1)
 def db_connect() -> StandardDatabase:
+    """The database handle is shared by the whole process"""
     url, username, password, db_name = config.arango_db_auth()
-    client = ArangoClient(hosts=url)
+    client = ArangoClient(hosts=url, http_client=PooledHTTPClient(config.arango_db_pool_size()))
     sys_db = client.db('_system', username=username, password=password)
     if not sys_db.has_database(db_name):
         sys_db.create_database(db_name)
@@ -44,16 +149,108 @@ def db_connect() -> StandardDatabase:
     return db
 
 
+COLLECTIONS = set()
+COLLECTIONS_LOCK = threading.Lock()
+
+
 def create_collection(db: StandardDatabase, name: str, unique_fields: Tuple, _schema: Dict):
-    if not db.has_collection(name):
-        collection = db.create_collection(name=name, schema=_schema)
-        collection.add_hash_index(fields=unique_fields, unique=True)
+    with COLLECTIONS_LOCK:
+        if name not in COLLECTIONS:
+            if not db.has_collection(name):
+                collection = db.create_collection(name=name, schema=_schema)
+                collection.add_persistent_index(fields=unique_fields, unique=True)
+            COLLECTIONS.add(name)
+
+
+def delete_collection(db: StandardDatabase, name: str):
+    with COLLECTIONS_LOCK:
+        COLLECTIONS.discard(name)
+        if db.has_collection(name):
+            LOG.info(f'Erasing arango collection: {name}')
+            deleted = db.delete_collection(name)
+            assert deleted
+
+
+def migrate_collection(db: StandardDatabase, name: str, unique_fields: Tuple):
+    """
+    Replaces the unique hash index with the persistent one which supports sorted range scans,
+    the hash index is an alias of the persistent one in RocksDB so it is deleted only if a separate one exists
+    """
+    if db.has_collection(name):
+        collection = db.collection(name)
+
+        def unique_indexes() -> List[Dict]:
+            return [i for i in collection.indexes() if tuple(i['fields']) == unique_fields and i.get('unique')]
+
+        kept = set()
+        if not any(i['type'] == 'persistent' for i in unique_indexes()):
+            LOG.info(f'Adding persistent index {unique_fields} to arango collection: {name}')
+            kept.add(collection.add_persistent_index(fields=unique_fields, unique=True)['id'])
+        indexes = unique_indexes()
+        kept |= {i['id'] for i in indexes if i['type'] == 'persistent'}
+        for index in indexes:
+            if index['type'] == 'hash' and index['id'] not in kept:
+                LOG.info(f'Deleting hash index {unique_fields} from arango collection: {name}')
+                collection.delete_index(index['id'])
+
+
+def to_documents(series: List[Dict]) -> List[Dict]:
+    """Converts bars to plain documents which can be serialized for the database"""
+    return [s.to_dict() if type(s) == Bar else s for s in series]
+
+
+class DocumentError(RuntimeError):
+    pass
+
+
+def insert_many(db: StandardDatabase,
+                name: str,
+                documents: List[Dict],
+                unique_fields: Tuple,
+                overwrite_mode: str,
+                update_fields: Tuple = None) -> List:
+    """
+    Inserts documents which collide on the unique fields depending on overwrite_mode:
+    conflict - fails with the error per document, replace - replaces the existing document,
+    update - updates the update_fields of the existing document keeping the others, ignore - skips it
+    :returns per document the written document, None if it has been skipped or the error if it failed
+    """
+    if overwrite_mode == OVERWRITE_CONFLICT:
+        return db.collection(name).insert_many(documents)
+
+    match = ', '.join(f'{f}: datum.{f}' for f in unique_fields)
+    action = {OVERWRITE_REPLACE: 'REPLACE datum',
+              OVERWRITE_UPDATE: 'UPDATE KEEP(datum, @fields)' if update_fields else 'UPDATE datum',
+              OVERWRITE_IGNORE: 'UPDATE {}'}[overwrite_mode]
+    query = f'''
+        FOR datum IN @documents
+            UPSERT {{ {match} }}
+            INSERT datum
+            {action} IN @@collection OPTIONS {{ ignoreErrors: true }}
+            RETURN {{ {match}, written: NEW != null, existed: OLD != null }}
+    '''
+    bind_vars = {'documents': documents, '@collection': name}
+    if overwrite_mode == OVERWRITE_UPDATE and update_fields:
+        bind_vars['fields'] = update_fields
+    outcomes = {tuple(o[f] for f in unique_fields): o for o in db.aql.execute(query, bind_vars=bind_vars)}
+
+    result = []
+    for document in documents:
+        outcome = outcomes.get(tuple(document[f] for f in unique_fields))
+        if not outcome or not outcome['written']:
+            result += [DocumentError('The document has been rejected by the collection')]
+        elif overwrite_mode == OVERWRITE_IGNORE and outcome['existed']:
+            result += [None]
+        else:
+            result += [document]
+    return result
 
 
 class Series:
     def __init__(self, name: str, editable: bool, unique_fields: Tuple, _schema: Dict):
         self.name = name
         self.editable = editable
+        self.unique_fields = unique_fields
         self.db = db_connect()
         create_collection(self.db, self.name, unique_fields, _schema)
 
@@ -70,16 +267,16 @@ class Series:
             else:
                 self.tnx_db.commit_transaction()
 
-    def __iadd__(self, series: List[Clazz]) -> 'Series':
-        result = self.tnx_collection.insert_many(series, sync=True)
+    def __iadd__(self, series: List[Dict]) -> 'Series':
+        result = self.tnx_collection.insert_many(to_documents(series), sync=True)
         return self.verify_result(result)
 
-    def __imul__(self, series: List[Clazz]) -> 'Series':
-        result = self.tnx_collection.replace_many(series, sync=True)
+    def __imul__(self, series: List[Dict]) -> 'Series':
+        result = self.tnx_collection.replace_many(to_documents(series), sync=True)
         return self.verify_result(result)
 
-    def __ior__(self, series: List[Clazz]) -> 'Series':
-        result = self.tnx_collection.update_many(series, merge=False, sync=True)
+    def __ior__(self, series: List[Dict]) -> 'Series':
+        result = self.tnx_collection.update_many(to_documents(series), merge=False, keep_none=False, sync=True)
         return self.verify_result(result)
 
     def verify_result(self, result: List) -> 'Series':
@@ -106,21 +303,134 @@ class ExchangeSeries(Series):
 
 
 class SecuritySeries(Series):
-    def __init__(self, name: str, editable: bool, dt_from: DateTime):
-        super().__init__(name, editable, ('symbol', 'timestamp'), schema.SECURITY_SCHEMA)
+    def __init__(self, name: str, editable: bool, dt_from: DateTime, dt_to: DateTime = None):
+        super().__init__(name, editable, SECURITY_UNIQUE_FIELDS, schema.SECURITY_SCHEMA)
         self.ts_from = (dt_from or config.datetime_from()).to_timestamp()
+        self.ts_to = dt_to.to_timestamp() if dt_to else TIMESTAMP_MAX
+        self.cache = cache.ColumnCache(name)
+        self.cache_pending = defaultdict(list)
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        super().__exit__(exc_type, exc_val, exc_tb)
+        if self.editable and not exc_type:
+            self.cache_commit()
+        self.cache_pending.clear()
+
+    def __iadd__(self, series: List[Bar]) -> 'SecuritySeries':
+        super().__iadd__(series)
+        return self.cache_sync(series)
+
+    def __imul__(self, series: List[Bar]) -> 'SecuritySeries':
+        super().__imul__(series)
+        return self.cache_sync(series)
+
+    def cache_sync(self, series: List[Dict]) -> 'SecuritySeries':
+        """Column cache is updated once the transaction is committed"""
+        for datum in series:
+            self.cache_pending[datum['symbol']] += [datum]
+        return self
 
-    def __getitem__(self, symbol: str) -> List[Clazz]:
+    def cache_commit(self):
+        for symbol, documents in self.cache_pending.items():
+            self.cache.merge(symbol, documents)
+        self.cache_pending.clear()
+
+    def __getitem__(self, symbol: str) -> List[Bar]:
         query = '''
             FOR datum IN @@collection
-                SORT datum.timestamp
                 FILTER datum.symbol == @symbol
-                    AND datum.timestamp >= @timestamp
+                    AND datum.timestamp >= @ts_from
+                    AND datum.timestamp <= @ts_to
+                SORT datum.timestamp
                 RETURN datum
         '''
-        bind_vars = {'symbol': symbol, '@collection': self.name, 'timestamp': self.ts_from}
+        bind_vars = {'symbol': symbol, '@collection': self.name, 'ts_from': self.ts_from, 'ts_to': self.ts_to}
         records = self.tnx_db.aql.execute(query, bind_vars=bind_vars)
-        return [Clazz(**r) for r in records]
+        return [Bar(r) for r in records]
+
+    def bulk(self,
+             symbols: Iterable[str],
+             batch_size: int = BATCH_SIZE,
+             ts_froms: Dict[str, int] = None) -> Iterator[Tuple[str, List[Bar]]]:
+        """
+        Streams all the symbols in a single query, yields (symbol, series) in the collation order of the query
+        followed by symbols without any series. Optional ts_froms narrow the series to the later timestamps.
+        """
+        symbols = sorted(set(symbols))
+        ts_froms = {s: max(self.ts_from, (ts_froms or {}).get(s, 0)) for s in symbols}
+        query = '''
+            FOR datum IN @@collection
+                FILTER datum.symbol IN @symbols
+                    AND datum.timestamp >= @ts_froms[datum.symbol]
+                    AND datum.timestamp <= @ts_to
+                SORT datum.symbol, datum.timestamp
+                RETURN datum
+        '''
+        bind_vars = {'symbols': symbols, '@collection': self.name, 'ts_froms': ts_froms, 'ts_to': self.ts_to}
+        records = self.tnx_db.aql.execute(query, bind_vars=bind_vars, batch_size=batch_size, stream=True)
+
+        yielded = set()
+        for symbol, documents in groupby(records, key=lambda r: r['symbol']):
+            yielded.add(symbol)
+            yield symbol, [Bar(d) for d in documents]
+        for symbol in symbols:
+            if symbol not in yielded:
+                yield symbol, []
+
+    def write_behind(self,
+                     max_count: int = BUFFER_COUNT,
+                     max_bytes: int = BUFFER_BYTES,
+                     max_delay: float = BUFFER_DELAY,
+                     overwrite_mode: str = OVERWRITE_CONFLICT) -> 'WriteBehind':
+        return WriteBehind(self, max_count, max_bytes, max_delay, overwrite_mode)
+
+    def columns(self, symbol: str) -> np.ndarray:
+        """Reads (timestamp, open, high, low, close, volume) columns from the cache, loads the symbol on a miss"""
+        columns = self.cache.range(symbol, self.ts_from, self.ts_to)
+        if columns is None:
+            query = '''
+                FOR datum IN @@collection
+                    FILTER datum.symbol == @symbol
+                    RETURN KEEP(datum, @fields)
+            '''
+            bind_vars = {'symbol': symbol, '@collection': self.name, 'fields': cache.BAR_DTYPE.names}
+            records = self.tnx_db.aql.execute(query, bind_vars=bind_vars)
+            self.cache[symbol] = cache.to_columns(list(records))
+            columns = self.cache.range(symbol, self.ts_from, self.ts_to)
+        return columns
+
+    def bulk_columns(self, symbols: Iterable[str], batch_size: int = BATCH_SIZE) -> Dict[str, np.ndarray]:
+        """Reads columns of all the symbols from the cache, symbols missing in the cache are loaded in a single query"""
+        symbols = sorted(set(symbols))
+        missing = [s for s in symbols if s not in self.cache]
+        if missing:
+            query = '''
+                FOR datum IN @@collection
+                    FILTER datum.symbol IN @symbols
+                    SORT datum.symbol
+                    RETURN KEEP(datum, @fields)
+            '''
+            bind_vars = {'symbols': missing, '@collection': self.name, 'fields': ('symbol',) + cache.BAR_DTYPE.names}
+            records = self.tnx_db.aql.execute(query, bind_vars=bind_vars, batch_size=batch_size, stream=True)
+            for symbol, documents in groupby(records, key=lambda r: r['symbol']):
+                self.cache[symbol] = cache.to_columns(list(documents))
+            for symbol in missing:
+                if symbol not in self.cache:
+                    self.cache[symbol] = cache.to_columns([])
+        return {s: self.cache.range(s, self.ts_from, self.ts_to) for s in symbols}
+
+    def counts(self, symbols: Iterable[str]) -> Dict[str, int]:
+        query = '''
+            FOR datum IN @@collection
+                FILTER datum.symbol IN @symbols
+                    AND datum.timestamp >= @ts_from
+                    AND datum.timestamp <= @ts_to
+                COLLECT symbol = datum.symbol WITH COUNT INTO count
+                RETURN {symbol, count}
+        '''
+        bind_vars = {'symbols': list(symbols), '@collection': self.name, 'ts_from': self.ts_from, 'ts_to': self.ts_to}
+        records = self.tnx_db.aql.execute(query, bind_vars=bind_vars)
+        return {r['symbol']: r['count'] for r in records}
 
     def time_range(self) -> Dict[str, Clazz]:
         query = '''
@@ -135,15 +445,87 @@ class SecuritySeries(Series):
                 for r in records}
 
 
+class WriteBehind:
+    """
+    Accumulates security documents across symbols and inserts them in large batches,
+    each batch is a single transaction committed with one disk sync.
+    The buffer is flushed when any of the count, bytes or delay limits is reached and on exit.
+    """
+
+    def __init__(self, series: SecuritySeries, max_count: int, max_bytes: int, max_delay: float, overwrite_mode: str):
+        self.series = series
+        self.max_count = max_count
+        self.max_bytes = max_bytes
+        self.max_delay = max_delay
+        self.overwrite_mode = overwrite_mode
+        self.documents = []
+        self.size = 0
+        self.since = time.monotonic()
+        self.inserted = 0
+        self.errors = []
+
+    def __enter__(self) -> 'WriteBehind':
+        atexit.register(self.flush)
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        atexit.unregister(self.flush)
+        self.flush()
+        if self.errors:
+            LOG.error(f'Documents: {len(self.errors)} failed to insert into {self.series.name}')
+
+    def __iadd__(self, series: List[Bar]) -> 'WriteBehind':
+        if not self.documents:
+            self.since = time.monotonic()
+        documents = to_documents(series)
+        self.documents += documents
+        self.size += sum(len(json.dumps(d)) for d in documents)
+        if len(self.documents) >= self.max_count \
+                or self.size >= self.max_bytes \
+                or time.monotonic() - self.since >= self.max_delay:
+            self.flush()
+        return self
+
+    def flush(self):
+        documents, self.documents, self.size = self.documents, [], 0
+        if documents:
+            name = self.series.name
+            tnx_db = self.series.db.begin_transaction(write=name, sync=True)
+            try:
+                result = insert_many(tnx_db, name, documents, self.series.unique_fields, self.overwrite_mode,
+                                     cache.BAR_DTYPE.names)  # the analysis of updated documents is kept
+            except:
+                tnx_db.abort_transaction()
+                raise
+            tnx_db.commit_transaction()
+
+            inserted = []
+            for document, r in zip(documents, result):
+                if isinstance(r, Exception):
+                    LOG.error(f'Insert failed {name}: {document["symbol"]} {document["timestamp"]} {r}')
+                    self.errors += [(document, r)]
+                elif r is not None:
+                    inserted += [document]
+            self.inserted += len(inserted)
+            LOG.debug(f'Documents: {len(inserted)} of {len(documents)} inserted into {name}')
+
+            self.series.cache_sync(inserted).cache_commit()
+
+
 def exchange_erase():
     LOG.info(f'>> {exchange_erase.__name__}')
 
-    name = 'exchange'
     db = db_connect()
-    if db.has_collection(name):
-        LOG.info(f'Erasing arango collection: {name}')
-        deleted = db.delete_collection(name)
-        assert deleted
+    delete_collection(db, 'exchange')
+
+
+def security_migrate(engine: Any):
+    LOG.info(f'>> {security_migrate.__name__}')
+
+    db = db_connect()
+    for interval in (tool.INTERVAL_1H, tool.INTERVAL_1D, tool.INTERVAL_1W):
+        name = f'security_{tool.source_name(engine, interval)}'
+        migrate_collection(db, name, SECURITY_UNIQUE_FIELDS)
 
 
 def security_erase(engine: Any):
@@ -152,7 +534,8 @@ def security_erase(engine: Any):
     db = db_connect()
     for interval in (tool.INTERVAL_1H, tool.INTERVAL_1D, tool.INTERVAL_1W):
         name = f'security_{tool.source_name(engine, interval)}'
-        if db.has_collection(name):
-            LOG.info(f'Erasing arango collection: {name}')
-            deleted = db.delete_collection(name)
-            assert deleted
+        cache.ColumnCache(name).erase()
+        for exchange in config.EXCHANGES:
+            panel.Panel(name, exchange).erase()
+            config.STORE_PATH.joinpath(f'{tool.unfilled_name(engine, interval, exchange)}.json').unlink(missing_ok=True)
+        delete_collection(db, name)
@@ -1,11 +1,13 @@
 from collections import deque
-from typing import List
+from typing import List, Tuple, Iterable, Optional
 
-from src import tool
-from src.clazz import Clazz
+import numpy as np
 
+from src import tool, kernel
+from src.clazz import Clazz, Bar
 
-def init(series: List[Clazz]) -> List[Clazz]:
+
+def init(series: List[Bar]) -> List[Clazz]:
     for s in series:
         s.update(tool.SECURITY_SCORE_DEFAULT)
 
@@ -54,7 +56,7 @@ def reduce(series: List[Clazz], score: int) -> List[Clazz]:
     return list(queue)
 
 
-def display(series: List[Clazz], score: int) -> List[Clazz]:
+def display(series: List[Bar], score: int) -> List[Clazz]:
     results = []
     if score:
         assert 1 <= score <= 8
@@ -85,7 +87,178 @@ def display(series: List[Clazz], score: int) -> List[Clazz]:
     return results
 
 
-def calculate(series: List[Clazz]):
-    reduced = init(series)
-    for score in range(1, 8):
-        reduced = reduce(reduced, score)
+LOW_SCORE, HIGH_SCORE, VALID_LOW_SCORE, VALID_HIGH_SCORE = range(4)
+SCORE_FIELDS = ('low_score', 'high_score', 'valid_low_score', 'valid_high_score')
+
+
+def to_values(series: List[Bar]) -> Tuple[List[int], List[float]]:
+    """The same (index, value) pairs as init() returns but as compact lists"""
+    indexes, values = [], []
+    for i, s in enumerate(series):
+        low, high = s.low, s.high
+        if low != high:  # avoid duplicates
+            # assume order is (open, low, high, close) for (open < close)
+            indexes += (i, i)
+            values += (low, high) if s.close > s.open else (high, low)
+        else:
+            indexes.append(i)
+            values.append(low)
+    return indexes, values
+
+
+class Cascade:
+    """
+    Streams elements through all the scores in one pass, it is equivalent to the sequence of reduce() calls.
+    Only the last two elements of every score queue are kept, the element before the last one is final
+    and is pushed to the next score as soon as a new element is appended behind it.
+    Scores are assigned with max() as the following score always overwrites the previous one in reduce().
+    """
+
+    def __init__(self, size: int, scores: Iterable[int] = range(1, 8)):
+        self.scores = list(scores)
+        self.ratios = [limit_ratio(score) for score in self.scores]
+        self.queues = [[] for _ in self.scores]
+        self.results = [[0] * size for _ in SCORE_FIELDS]
+
+    def push(self, level: int, index: int, value: float):
+        low, high, valid_low, valid_high = self.results
+        while level < len(self.scores):
+            queue = self.queues[level]
+            if len(queue) < 2:
+                queue += [(index, value)]
+                if len(queue) == 2:
+                    return
+            else:
+                score = self.scores[level]
+                (_, value1), (index2, value2) = queue
+                limit = self.ratios[level] * value2
+
+                if value2 < value1:
+                    if value < value2:
+                        low[index] = max(low[index], score)
+                        queue[1] = (index, value)
+                        return
+                    elif value > value2 + limit:
+                        valid_low[index2] = max(valid_low[index2], score)
+                        high[index] = max(high[index], score)
+                    else:
+                        return
+                elif value2 > value1:
+                    if value > value2:
+                        high[index] = max(high[index], score)
+                        queue[1] = (index, value)
+                        return
+                    elif value < value2 - limit:
+                        valid_high[index2] = max(valid_high[index2], score)
+                        low[index] = max(low[index], score)
+                    else:
+                        return
+                else:
+                    return
+
+                queue[0], queue[1] = queue[1], (index, value)
+                index, value = index2, value2
+            level += 1
+
+    def extend(self, indexes: List[int], values: List[float]):
+        for index, value in zip(indexes, values):
+            self.push(0, index, value)
+
+    def flush(self):
+        for level, queue in enumerate(self.queues[:-1]):
+            if len(queue) == 2:
+                self.push(level + 1, *queue[1])
+
+    def __call__(self, indexes: List[int], values: List[float]) -> List[List[int]]:
+        self.extend(indexes, values)
+        self.flush()
+        return self.results
+
+
+class JitCascade:
+    """The same cascade running the compiled kernel over arrays, queues and results are converted on access"""
+
+    def __init__(self, size: int, scores: Iterable[int] = range(1, 8)):
+        self.scores = np.array(list(scores), dtype=np.int64)
+        self.ratios = np.array([limit_ratio(score) for score in self.scores])
+        self.queue_size = np.zeros(len(self.scores), dtype=np.int64)
+        self.queue_index = np.full((len(self.scores), 2), -1, dtype=np.int64)
+        self.queue_value = np.zeros((len(self.scores), 2))
+        self.scores_array = np.zeros((len(SCORE_FIELDS), size), dtype=np.int64)
+
+    @property
+    def queues(self) -> List[List[Tuple[Optional[int], float]]]:
+        return [[(None if i < 0 else i, v) for i, v in zip(index[:size].tolist(), value[:size].tolist())]
+                for size, index, value in zip(self.queue_size.tolist(), self.queue_index, self.queue_value)]
+
+    @queues.setter
+    def queues(self, queues: List[List[Tuple[Optional[int], float]]]):
+        for level, queue in enumerate(queues):
+            self.queue_size[level] = len(queue)
+            for j, (index, value) in enumerate(queue):
+                self.queue_index[level, j] = -1 if index is None else index
+                self.queue_value[level, j] = value
+
+    @property
+    def results(self) -> List[List[int]]:
+        return self.scores_array.tolist()
+
+    @results.setter
+    def results(self, results: List[List[int]]):
+        self.scores_array[:] = results
+
+    def kernel_args(self) -> Tuple:
+        return self.scores, self.ratios, self.queue_size, self.queue_index, self.queue_value, self.scores_array
+
+    def extend(self, indexes: List[int], values: List[float]):
+        kernel.cascade_extend(np.array(indexes, dtype=np.int64), np.array(values), *self.kernel_args())
+
+    def flush(self):
+        kernel.cascade_flush(*self.kernel_args())
+
+
+def calculate(series: List[Bar], state: Optional[Clazz] = None, jit: bool = None) -> Optional[Clazz]:
+    """
+    Calculates scores of the whole series or only of data appended since the state has been saved.
+    Scores written by the final flush are journaled to restore them before the cascade is continued.
+    The compiled kernel is used if jit is set, it defaults to kernel.ENABLED.
+    :returns the state for the next incremental calculation
+    """
+    positions = {s.timestamp: i for i, s in enumerate(series)}
+    cascade = (JitCascade if (kernel.ENABLED if jit is None else jit) else Cascade)(len(series))
+    begin = 0
+    if state:
+        begin = positions[state.timestamp] + 1
+        for timestamp, *scores in state.journal:
+            series[positions[timestamp]].update(zip(SCORE_FIELDS, scores))
+        cascade.results = [[s[f] if i < begin else 0 for i, s in enumerate(series)] for f in SCORE_FIELDS]
+        cascade.queues = [[(positions.get(t), v) for t, v in queue] for queue in state.queues]
+
+    indexes, values = to_values(series[begin:])
+    cascade.extend([begin + i for i in indexes], values)
+
+    queues = [[[None if i is None else series[i].timestamp, v] for i, v in queue] for queue in cascade.queues]
+    results = [r[:] for r in cascade.results]
+    cascade.flush()
+    flushed = cascade.results
+    journal = [[series[i].timestamp, *scores]
+               for i, (scores, flushed_scores) in enumerate(zip(zip(*results), zip(*flushed)))
+               if scores != flushed_scores]
+
+    for s in series[begin:]:
+        s.test = Clazz()
+    for s, low, high, valid_low, valid_high in zip(series, *flushed):
+        s.low_score, s.high_score, s.valid_low_score, s.valid_high_score = low, high, valid_low, valid_high
+
+    if series:
+        return Clazz(timestamp=series[-1].timestamp, queues=queues, journal=journal)
+    return None
+
+
+def state_from(state: Clazz) -> int:
+    """
+    :returns the first timestamp the series has to be loaded from to continue the calculation,
+    scores are written only to the last element of a queue so the first one needs no datum
+    """
+    timestamps = [queue[1][0] for queue in state.queues if len(queue) == 2] + [t for t, *_ in state.journal]
+    return min(timestamps + [state.timestamp])
@@ -8,7 +8,7 @@ from functools import lru_cache
 from pathlib import Path
 from typing import List, Iterable, Tuple, Set, Union, Any
 
-from src import holidays
+from src import calendars
 from src.clazz import Clazz
 
 DT_FORMAT = '%Y-%m-%d %H:%M:%S'
@@ -129,6 +129,16 @@ def health_name(engine: Any, interval: Union[timedelta, str]) -> str:
     return f'{source}_health'
 
 
+def rolling_name(engine: Any, interval: Union[timedelta, str], exchange: str) -> str:
+    source = source_name(engine, interval)
+    return f'{source}_rolling_{exchange}'
+
+
+def unfilled_name(engine: Any, interval: Union[timedelta, str], exchange: str) -> str:
+    source = source_name(engine, interval)
+    return f'{source}_unfilled_{exchange}'
+
+
 SECURITY_SCORE_DEFAULT = {'low_score': 0, 'high_score': 0, 'valid_low_score': 0, 'valid_high_score': 0, 'test': {}}
 
 
@@ -136,18 +146,11 @@ SECURITY_SCORE_DEFAULT = {'low_score': 0, 'high_score': 0, 'valid_low_score': 0,
 
 @lru_cache(maxsize=16)
 def exchange_holidays(exchange: str) -> Set[DateTime]:
-    return {DateTime.parse_datetime(dt) for dt in holidays.EXCHANGE_HOLIDAYS[exchange]}
+    return {DateTime.from_timestamp(ts) for ts in calendars.exchange_holidays(exchange).tolist()}
 
 
 def last_workday(exchange: str, dt: DateTime) -> DateTime:
-    _holidays = exchange_holidays(exchange)
-    d = dt.toordinal()
-    while True:
-        d -= 1
-        day = DateTime.fromordinal(d)
-        day = day.replace(tzinfo=timezone.utc)
-        if day.weekday() in (0, 1, 2, 3, 4) and day not in _holidays:
-            return day
+    return DateTime.from_timestamp(calendars.last_session(exchange, INTERVAL_1D, dt.to_timestamp()))
 
 
 def last_sunday(dt: DateTime) -> DateTime:
@@ -157,11 +160,11 @@ def last_sunday(dt: DateTime) -> DateTime:
 
 def last_session(exchange: str, interval: timedelta, dt: DateTime) -> DateTime:
     """
-    It returns datetime where all fields smaller than interval are set to zero.
+    It returns the last session of the exchange calendar, the weekly session has no calendar and starts on sunday.
     It is up to a data driver to modify it to meet a provider requirements.
     """
     if interval == INTERVAL_1H:
-        return dt.replace(minute=0, second=0, microsecond=0)
+        return DateTime.from_timestamp(calendars.last_session(exchange, INTERVAL_1H, dt.to_timestamp()))
     if interval == INTERVAL_1D:
         return last_workday(exchange, dt)
     if interval == INTERVAL_1W:
@@ -1,20 +1,19 @@
-import csv
 import logging
 import re
-from datetime import timedelta, timezone
-from io import StringIO
-from typing import List, Dict, Optional
+from datetime import timedelta
+from typing import List
 
-from src import tool, store, session, config, flow
-from src.clazz import Clazz
+from src import tool, store, session, parser
+from src.clazz import Bar
 from src.tool import DateTime
 
 LOG = logging.getLogger(__name__)
 
-DT_FORMAT = '%Y-%m-%d'
 QUOTE_URL = 'https://finance.yahoo.com/quote'
 SYMBOL_URL = 'https://query1.finance.yahoo.com/v7/finance/download/{symbol}'
 PATTERN = re.compile('"CrumbStore":{"crumb":"(.+?)"}')
+FETCH_WORKERS = 4
+PLAN_SIZE = 4096  # sessions of a single series request
 
 
 def interval_to_yahoo(interval: timedelta):
@@ -24,25 +23,6 @@ def interval_to_yahoo(interval: timedelta):
     }[interval]
 
 
-def timestamp_from_yahoo(date: str) -> int:
-    dt = DateTime.strptime(date, DT_FORMAT)
-    return dt.replace(tzinfo=timezone.utc).to_timestamp()
-
-
-def datum_from_yahoo(dt: Dict, symbol: str) -> Optional[Clazz]:
-    try:
-        return Clazz(symbol=symbol,
-                     timestamp=timestamp_from_yahoo(dt['Date']),
-                     open=float(dt['Open']),
-                     close=float(dt['Close']),
-                     low=float(dt['Low']),
-                     high=float(dt['High']),
-                     volume=int(dt['Volume']),
-                     **tool.SECURITY_SCORE_DEFAULT)
-    except:
-        return None
-
-
 class Session(session.Session):
     def __enter__(self) -> 'Session':
         response = self.get(QUOTE_URL)
@@ -53,13 +33,11 @@ class Session(session.Session):
         self.crumb = found.group(1)
         return self
 
-    def series(self, symbol: str, dt_from: DateTime, dt_to: DateTime, interval: timedelta) -> List[Clazz]:
+    def series(self, symbol: str, dt_from: DateTime, dt_to: DateTime, interval: timedelta) -> List[Bar]:
         short_symbol, exchange = tool.symbol_split(symbol)
         if exchange not in ('NYSE', 'NASDAQ'):
             return []
 
-        flow.wait(max(0.6 - config.loop_delay(), 0))  # sleep at least 0.6 including loop in the flow module
-
         yahoo_symbol = short_symbol.replace('.', '-')
         yahoo_from = dt_from.to_timestamp()
         yahoo_to = (dt_to + interval).to_timestamp()
@@ -71,18 +49,15 @@ class Session(session.Session):
         if response.status_code in (400, 404):
             return []
         assert response.status_code == 200, f'url: {url} params: {params} reply: {response.text}'
-        data = [datum_from_yahoo(item, symbol) for item in csv.DictReader(StringIO(response.text))]
-        if len(data) == 2 and data[0].timestamp == data[1].timestamp:
-            data = data[0:1]  # if yahoo returns 2 rows with duplicated values
-        data = [
-            datum
-            for datum in data
-            if datum and yahoo_from <= datum.timestamp <= yahoo_to
-        ]
-        return data
+        columns, malformed = parser.parse_ohlc(response.content, parser.YAHOO_COLUMNS, parser.YAHOO_DATE_FORMAT)
+        parser.report_malformed(symbol, malformed)
+        if len(columns) == 2 and columns[0]['timestamp'] == columns[1]['timestamp']:
+            columns = columns[0:1]  # if yahoo returns 2 rows with duplicated values
+        timestamps = columns['timestamp']
+        return parser.to_series(symbol, columns[(yahoo_from <= timestamps) & (timestamps <= yahoo_to)])
 
 
 class SecuritySeries(store.SecuritySeries):
-    def __init__(self, interval: timedelta, editable=False, dt_from: DateTime = None):
+    def __init__(self, interval: timedelta, editable=False, dt_from: DateTime = None, dt_to: DateTime = None):
         name = f'security_{tool.source_name(__name__, interval)}'
-        super().__init__(name, editable, dt_from)
+        super().__init__(name, editable, dt_from, dt_to)
@@ -1,4 +1,7 @@
-from src import analyse, tool, yahoo, swings
+import orjson as json
+import pytest
+
+from src import analyse, tool, yahoo, swings, config
 from src.clazz import Clazz
 
 SERIES = [
@@ -57,3 +60,82 @@ def test_action():
 
     swings.calculate(time_series)
     analyse.action(time_series)
+
+
+def test_delta():
+    loaded = [Clazz(_id=f'security/{i}', timestamp=s.timestamp, close=s.close, low_score=0)
+              for i, s in enumerate(SERIES[:3])]
+    series = [Clazz(s) for s in loaded]
+    series[1].low_score = 2
+    series[2]['sma-3'] = 2.0
+    del series[0]['low_score']
+    changes = analyse.delta(loaded, series)
+    assert changes == [Clazz(_id='security/0', low_score=None),
+                       Clazz(_id='security/1', low_score=2),
+                       Clazz(_id='security/2', **{'sma-3': 2.0})]
+
+
+def test_rolling():
+    series = [Clazz(s) for s in SERIES]
+    state = analyse.rolling(series[:6], None, [3])
+    assert analyse.rolling_split(series, state) == 6
+
+    analyse.clean(series, 'sma-3', 'vma-3')
+    state = analyse.rolling(series[6:], state, [3])
+    assert state.count == len(SERIES)
+    assert [round(s['sma-3'], 6) for s in series[2:]] == [2.0, 3.0, 4.0, 4.333333, 4.0, 3.666667, 4.0, 5.0]
+    assert [round(s['vma-3'], 6) for s in series[6:]] == [4.542857, 3.906977, 4.204082, 4.733333]
+
+
+def test_rolling_rewritten():
+    series = [Clazz(s) for s in SERIES]
+    state = analyse.rolling(series[:6], None, [3])
+    series[4] = Clazz(series[4], close=7.0)
+    assert analyse.rolling_split(series, state) == 0
+    assert analyse.rolling_split(series[1:], state) == 0
+
+
+def test_indicators():
+    with config.TESTS_PATH.joinpath('sample.json').open() as sample_io:
+        sample = json.loads(sample_io.read())
+        series = [Clazz(s) for s in sample['KGH.WSE']]
+    analyse.clean(series)
+
+    w_sizes = [5, 50, 200]
+    results = analyse.indicators(analyse.to_columns(series), w_sizes)
+    for w_size in w_sizes:
+        analyse.sma(series, w_size)
+        analyse.vma(series, w_size)
+        analyse.volatile(series, w_size)
+
+    for name, values in results.items():
+        expected = [s.get(name) for s in series]
+        assert [None if v != v else pytest.approx(v) for v in values.tolist()] == expected
+
+
+@pytest.mark.parametrize('jit', [False, True])
+def test_action_resume(jit):
+    with config.TESTS_PATH.joinpath('sample.json').open() as sample_io:
+        sample = json.loads(sample_io.read())
+        series = [Clazz(s) for s in sample['KGH.WSE']]
+    swings.calculate(series)
+
+    checkpoint = series[500].timestamp
+    result, state = analyse.action(series, checkpoint=checkpoint, jit=jit)
+    assert result.volume > 0
+    assert state.timestamp == checkpoint
+    assert analyse.action(series[500:], state, jit=jit) == (result, None)
+
+
+def test_action_kernel():
+    with config.TESTS_PATH.joinpath('sample.json').open() as sample_io:
+        sample = json.loads(sample_io.read())
+        series1 = [Clazz(s) for s in sample['KGH.WSE']]
+        series2 = [Clazz(s) for s in sample['KGH.WSE']]
+    swings.calculate(series1)
+    swings.calculate(series2)
+
+    checkpoint = series1[700].timestamp
+    assert analyse.action(series1, checkpoint=checkpoint, jit=False) == \
+           analyse.action(series2, checkpoint=checkpoint, jit=True)
+    assert series1 == series2
@@ -0,0 +1,34 @@
+from src import cache
+from src.clazz import Clazz
+
+SERIES = [
+    Clazz(symbol='XOM.NYSE', timestamp=1514937600, open=1.0, close=2.0, low=1.0, high=2.0, volume=8),
+    Clazz(symbol='XOM.NYSE', timestamp=1514851200, open=1.0, close=1.0, low=1.0, high=1.0, volume=3),
+    Clazz(symbol='XOM.NYSE', timestamp=1515024000, open=2.0, close=3.0, low=2.0, high=3.0, volume=1)
+]
+
+
+def test_to_columns():
+    columns = cache.to_columns(SERIES)
+    assert columns['timestamp'].tolist() == [1514851200, 1514937600, 1515024000]
+    assert columns['close'].tolist() == [1.0, 2.0, 3.0]
+
+
+def test_range(tmp_path):
+    column_cache = cache.ColumnCache('security_test_1d', tmp_path)
+    assert column_cache.range('XOM.NYSE', 0) is None
+
+    column_cache['XOM.NYSE'] = cache.to_columns(SERIES)
+    assert 'XOM.NYSE' in column_cache
+    assert column_cache.range('XOM.NYSE', 1514937600)['timestamp'].tolist() == [1514937600, 1515024000]
+    assert column_cache.range('XOM.NYSE', 0, 1514937600)['volume'].tolist() == [3, 8]
+
+
+def test_merge(tmp_path):
+    column_cache = cache.ColumnCache('security_test_1d', tmp_path)
+    column_cache.merge('XOM.NYSE', SERIES)
+    assert 'XOM.NYSE' not in column_cache  # not loaded yet
+
+    column_cache['XOM.NYSE'] = cache.to_columns(SERIES[:2])
+    column_cache.merge('XOM.NYSE', [Clazz(SERIES[0], close=2.5), SERIES[2]])
+    assert column_cache['XOM.NYSE']['close'].tolist() == [1.0, 2.5, 3.0]
@@ -0,0 +1,69 @@
+from datetime import timezone
+
+import numpy as np
+
+from src import calendars, tool, holidays, exante
+from src.tool import DateTime
+
+
+def walk_last_workday(exchange: str, dt: DateTime) -> DateTime:
+    """The former walk back over days"""
+    holiday_set = {DateTime.parse_datetime(h) for h in holidays.EXCHANGE_HOLIDAYS[exchange]}
+    d = dt.toordinal()
+    while True:
+        d -= 1
+        day = DateTime.fromordinal(d).replace(tzinfo=timezone.utc)
+        if day.weekday() in (0, 1, 2, 3, 4) and day not in holiday_set:
+            return day
+
+
+def test_last_session():
+    for exchange in ('WSE', 'NYSE', 'LSE'):
+        for ts in range(DateTime(2019, 12, 20).to_timestamp(), DateTime(2020, 1, 10).to_timestamp(), 7 * 60 * 60):
+            dt = DateTime.from_timestamp(ts)
+            expected = walk_last_workday(exchange, dt).to_timestamp()
+            assert calendars.last_session(exchange, tool.INTERVAL_1D, ts) == expected, dt
+
+    ts = DateTime(2020, 1, 6, 15, 30).to_timestamp()  # the epiphany is a WSE holiday
+    assert calendars.last_session('WSE', tool.INTERVAL_1H, ts) == DateTime(2020, 1, 3, 23).to_timestamp()
+    assert calendars.last_session('NYSE', tool.INTERVAL_1H, ts) == DateTime(2020, 1, 6, 15).to_timestamp()
+
+
+def test_next_session():
+    ts = DateTime(2020, 1, 3).to_timestamp()
+    assert calendars.next_session('WSE', tool.INTERVAL_1D, ts) == DateTime(2020, 1, 7).to_timestamp()
+    assert calendars.next_session('NYSE', tool.INTERVAL_1D, ts) == DateTime(2020, 1, 6).to_timestamp()
+    assert calendars.next_session('WSE', tool.INTERVAL_1H, ts) == DateTime(2020, 1, 3, 1).to_timestamp()
+
+
+def test_sessions_between():
+    ts_from = DateTime(2019, 12, 23).to_timestamp()
+    ts_to = DateTime(2020, 1, 7).to_timestamp()
+    sessions = calendars.sessions_between('WSE', tool.INTERVAL_1D, ts_from, ts_to)
+    assert [DateTime.from_timestamp(t).strftime('%m-%d') for t in sessions.tolist()] == [
+        '12-23', '12-27', '12-30', '01-02', '01-03', '01-07'
+    ]
+    assert calendars.count_sessions('WSE', tool.INTERVAL_1D, ts_from, ts_to) == 6
+    assert calendars.count_sessions('WSE', tool.INTERVAL_1H, ts_from, ts_to) == 5 * 24 + 1
+    assert np.all(np.diff(calendars.sessions('NYSE', tool.INTERVAL_1H)) > 0)
+
+
+def test_plan_requests():
+    sessions = calendars.sessions_between('WSE', tool.INTERVAL_1D,
+                                          DateTime(2020, 1, 2).to_timestamp(), DateTime(2020, 3, 31).to_timestamp())
+    missing = sessions[[0, 1, 4, 5, 6, 30, 31, 40]]
+    requests = calendars.plan_requests('WSE', tool.INTERVAL_1D, missing, 7)
+    assert requests == [(int(sessions[0]), int(sessions[6])),
+                        (int(sessions[30]), int(sessions[31])),
+                        (int(sessions[40]), int(sessions[40]))]
+    assert calendars.plan_requests('WSE', tool.INTERVAL_1D, missing, None) == [(int(sessions[0]), int(sessions[40]))]
+    assert calendars.plan_requests('WSE', tool.INTERVAL_1D, missing[:0], 7) == []
+
+
+def test_plan_requests_page_size():
+    missing = calendars.sessions_between('NYSE', tool.INTERVAL_1D,
+                                         DateTime(2000, 1, 1).to_timestamp(), DateTime(2020, 12, 31).to_timestamp())
+    requests = calendars.plan_requests('NYSE', tool.INTERVAL_1D, missing, exante.PLAN_SIZE)
+    sizes = [calendars.count_sessions('NYSE', tool.INTERVAL_1D, *r) for r in requests]
+    assert max(sizes) == exante.PLAN_SIZE < exante.MAX_SIZE
+    assert sum(sizes) == len(missing)
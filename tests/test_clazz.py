@@ -0,0 +1,55 @@
+import orjson as json
+import pytest
+
+from src import analyse, swings, store, tool
+from src.clazz import Clazz, Bar
+
+DATUM = dict(symbol='XOM.NYSE', timestamp=1514851200, open=1.0, close=2.0, low=0.5, high=2.5, volume=3,
+             **tool.SECURITY_SCORE_DEFAULT)
+
+
+def test_bar():
+    bar = Bar(DATUM, _id='security_yahoo_1d/1')
+    assert bar.close == bar['close'] == 2.0
+    assert type(bar.test) == Clazz
+    assert bar == Clazz(DATUM, _id='security_yahoo_1d/1')
+    assert bar.get('_rev') is None and '_rev' not in bar
+
+    bar['sma-50'] = 1.5
+    bar.test.long = 2.0
+    assert bar['sma-50'] == 1.5 and 'sma-50' in bar
+    assert list(bar)[-1] == 'sma-50'
+    assert bar.entry('sma-50') == {'_id': 'security_yahoo_1d/1', 'sma-50': 1.5}
+
+    bar.clean('sma-50', '_id')
+    assert 'sma-50' not in bar and '_id' not in bar
+    with pytest.raises(KeyError):
+        _ = bar['sma-50']
+    with pytest.raises(AttributeError):
+        _ = bar.missing
+
+
+def test_to_documents():
+    bar = Bar(DATUM)
+    bar.test.long = 2.0
+    documents = store.to_documents([bar, Clazz(DATUM)])
+    assert type(documents[0]) == dict and type(documents[1]) == Clazz
+    assert json.loads(json.dumps(documents[0])) == dict(DATUM, test={'long': 2.0})
+
+
+def test_analyse_bars():
+    series = [Bar(DATUM, _id=f'security_yahoo_1d/{i}', timestamp=DATUM['timestamp'] + i * 86400, close=2.0 + i % 3)
+              for i in range(100)]
+    loaded = [Bar(s) for s in series]
+    analyse.clean(series)
+    analyse.rolling(series, None, [10])
+    swings.calculate(series)
+    analyse.action(series)
+    assert all(type(s) == Bar for s in series)
+    changes = analyse.delta(loaded, series)
+    assert changes and all('sma-10' in c for c in changes[9:])
+
+
+def test_bar_security():
+    fields = ('symbol', 'timestamp', 'open', 'close', 'low', 'high', 'volume')
+    assert Bar.security(*(DATUM[f] for f in fields)) == Bar(DATUM)
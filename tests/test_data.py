@@ -1,6 +1,9 @@
 import jsonschema
+import numpy as np
 
-from src import data, store, config, schema
+from src import data, store, config, schema, calendars, tool
+from src.clazz import Bar
+from src.tool import DateTime
 
 
 def test_exchanges():
@@ -17,3 +20,54 @@ def test_exchanges():
 def _test_security_update():
     import src.exante as engine
     data.security_update(engine)
+
+
+def test_time_series_verify():
+    sessions = calendars.sessions_between('WSE', tool.INTERVAL_1D,
+                                          DateTime(2019, 12, 2).to_timestamp(), DateTime(2020, 1, 31).to_timestamp())
+    holiday = DateTime(2020, 1, 6).to_timestamp()
+    gap = DateTime(2020, 1, 15).to_timestamp()
+    timestamps = np.sort(np.append(sessions[sessions != gap], holiday))
+    overlap, missing = data.time_series_verify('KGH.WSE', timestamps,
+                                               int(timestamps[0]), DateTime(2020, 2, 4).to_timestamp(),
+                                               tool.INTERVAL_1D)
+    assert overlap.tolist() == [holiday]
+    assert [DateTime.from_timestamp(t).strftime('%m-%d') for t in missing.tolist()] == ['01-15', '02-03', '02-04']
+
+
+def test_missing_sessions():
+    ts_from = DateTime(2020, 1, 2).to_timestamp()
+    ts_to = DateTime(2020, 1, 10).to_timestamp()
+    sessions = calendars.sessions_between('WSE', tool.INTERVAL_1D, ts_from, ts_to)
+    assert data.missing_sessions('KGH.WSE', sessions[:0], ts_from, ts_to, tool.INTERVAL_1D).tolist() == sessions.tolist()
+    missing = data.missing_sessions('KGH.WSE', sessions[[1, 3]], ts_from, ts_to, tool.INTERVAL_1D)
+    assert missing.tolist() == sessions[[2, 4, 5]].tolist()
+
+    hours = calendars.sessions_between('WSE', tool.INTERVAL_1H, ts_from, ts_to)
+    missing = data.missing_sessions('KGH.WSE', hours[[9, 10]], ts_from, int(hours[14]), tool.INTERVAL_1H)
+    assert missing.tolist() == hours[11:15].tolist()
+
+
+def test_unstored_series():
+    sessions = calendars.sessions_between('WSE', tool.INTERVAL_1D,
+                                          DateTime(2020, 1, 2).to_timestamp(), DateTime(2020, 1, 10).to_timestamp())
+    series = [Bar.security('KGH.WSE', int(t), 90.0, 92.0, 89.5, 93.0, 400000) for t in sessions]
+    assert data.unstored_series(series, sessions[:0]) == series
+    unstored = data.unstored_series(series, sessions[[0, 2, 3]])
+    assert [s.timestamp for s in unstored] == sessions[[1, 4, 5]].tolist()
+
+
+def test_unfilled_sessions():
+    sessions = calendars.sessions_between('WSE', tool.INTERVAL_1D,
+                                          DateTime(2020, 1, 2).to_timestamp(), DateTime(2020, 1, 17).to_timestamp())
+    stored, missing = sessions[:2], sessions[2:]
+    fetched = np.delete(sessions[2:-2], [1, 4])
+    assert data.unfilled_sessions(missing, stored, fetched).tolist() == sessions[[3, 6]].tolist()
+    assert data.unfilled_sessions(missing, stored[:0], fetched[1:]).tolist() == sessions[[6]].tolist()
+    assert data.unfilled_sessions(missing, stored, fetched[:0]).tolist() == []
+
+    ts_to = int(sessions[-1])
+    unfilled = data.unfilled_sessions(missing, stored, fetched)
+    missing = data.missing_sessions('KGH.WSE', np.union1d(stored, fetched), int(sessions[0]), ts_to,
+                                    tool.INTERVAL_1D, unfilled)
+    assert missing.tolist() == sessions[-2:].tolist()
@@ -0,0 +1,95 @@
+import numpy as np
+
+from src import panel, cache, tool
+from src.clazz import Bar
+
+DAY = 24 * 60 * 60
+TS_20200102 = 1577923200  # Thursday, 2020-01-06 is the WSE holiday
+
+
+class ColumnSeries(dict):
+    """Serves columns of the symbols like SecuritySeries.columns() does from the column cache"""
+
+    def columns(self, symbol: str) -> np.ndarray:
+        return cache.to_columns(self.get(symbol, []))
+
+
+def bars(symbol: str, days: int, first: int = 0):
+    return [Bar(symbol=symbol, timestamp=TS_20200102 + d * DAY, open=1.0, close=float(d), low=1.0, high=2.0, volume=d)
+            for d in range(first, days)]
+
+
+def test_session_calendar():
+    sessions = panel.session_calendar('WSE', tool.INTERVAL_1D, TS_20200102, TS_20200102 + 6 * DAY)
+    assert (sessions - TS_20200102).tolist() == [0, DAY, 5 * DAY, 6 * DAY]
+    assert panel.session_calendar('WSE', tool.INTERVAL_1H, TS_20200102, TS_20200102 + 6 * DAY) is None
+
+
+def test_update(tmp_path):
+    series = ColumnSeries({'CDR.WSE': bars('CDR.WSE', 6), 'KGH.WSE': bars('KGH.WSE', 2, 1)})
+    wse_panel = panel.Panel('security_stooq_1d', 'WSE', tmp_path)
+    wse_panel.update(series, series.keys(), tool.INTERVAL_1D)
+    assert wse_panel.count == 3  # weekend and the holiday are skipped
+    assert wse_panel['close'][:, 0].tolist() == [0.0, 1.0, 5.0]
+    assert np.isnan(wse_panel['close'][:, 1]).tolist() == [True, False, True]
+
+    series['CDR.WSE'] += bars('CDR.WSE', 7, 6)
+    series['KGH.WSE'] += bars('KGH.WSE', 7, 6)
+    wse_panel = panel.Panel('security_stooq_1d', 'WSE', tmp_path)
+    wse_panel.update(series, series.keys(), tool.INTERVAL_1D)
+    assert (wse_panel.sessions - TS_20200102).tolist() == [0, DAY, 5 * DAY, 6 * DAY]
+    assert wse_panel['volume'][-1].tolist() == [6.0, 6.0]
+
+    loaded = panel.Panel('security_stooq_1d', 'WSE', tmp_path).load()
+    assert loaded.symbols == ['CDR.WSE', 'KGH.WSE'] and loaded.count == 4
+    assert np.array_equal(loaded['close'], wse_panel['close'], equal_nan=True)
+
+
+def test_update_symbols(tmp_path):
+    series = ColumnSeries({'CDR.WSE': bars('CDR.WSE', 2)})
+    wse_panel = panel.Panel('security_stooq_1d', 'WSE', tmp_path)
+    wse_panel.update(series, series.keys(), tool.INTERVAL_1D)
+    series['KGH.WSE'] = bars('KGH.WSE', 2)
+    wse_panel.update(series, series.keys(), tool.INTERVAL_1D)
+    assert wse_panel.count == 2 and wse_panel['close'].shape == (2, 2)
+
+
+def test_update_late(tmp_path):
+    series = ColumnSeries({'CDR.WSE': bars('CDR.WSE', 6), 'KGH.WSE': bars('KGH.WSE', 6, 5)})
+    wse_panel = panel.Panel('security_stooq_1d', 'WSE', tmp_path)
+    wse_panel.update(series, series.keys(), tool.INTERVAL_1D)
+    assert np.isnan(wse_panel['close'][:, 1]).tolist() == [True, True, False]
+
+    series['KGH.WSE'] = bars('KGH.WSE', 2, 1) + series['KGH.WSE']
+    wse_panel.update(series, series.keys(), tool.INTERVAL_1D)
+    assert wse_panel.count == 3
+    assert np.isnan(wse_panel['close'][:, 1]).tolist() == [True, False, False]
+    assert wse_panel['close'][:, 0].tolist() == [0.0, 1.0, 5.0]
+
+    series['CDR.WSE'] += bars('CDR.WSE', 7, 6)
+    wse_panel.update(series, series.keys(), tool.INTERVAL_1D)
+    assert (wse_panel.sessions - TS_20200102).tolist() == [0, DAY, 5 * DAY, 6 * DAY]
+    assert wse_panel['close'][:, 1].tolist()[1:3] == [1.0, 5.0]
+
+    series = ColumnSeries({'CDR.WSE': bars('CDR.WSE', 2)})  # a session without any bar is appended
+    wse_panel = panel.Panel('security_stooq_1d', 'WSE', tmp_path.joinpath('gap'))
+    wse_panel.update(series, series.keys(), tool.INTERVAL_1D)
+    series['CDR.WSE'] += bars('CDR.WSE', 7, 6)
+    wse_panel.update(series, series.keys(), tool.INTERVAL_1D)
+    assert (wse_panel.sessions - TS_20200102).tolist() == [0, DAY, 5 * DAY, 6 * DAY]  # the 7th has no bar yet
+    assert np.isnan(wse_panel['close'][:, 0]).tolist() == [False, False, True, False]
+
+    series['CDR.WSE'] = series['CDR.WSE'][:2] + bars('CDR.WSE', 6, 5) + series['CDR.WSE'][2:]
+    wse_panel.update(series, series.keys(), tool.INTERVAL_1D)
+    assert wse_panel['close'][:, 0].tolist() == [0.0, 1.0, 5.0, 6.0]
+
+    fresh_panel = panel.Panel('security_stooq_1d', 'WSE', tmp_path.joinpath('fresh'))
+    fresh_panel.update(series, series.keys(), tool.INTERVAL_1D)
+    assert np.array_equal(fresh_panel.sessions, wse_panel.sessions)
+
+    hours = ColumnSeries({'CDR.WSE': bars('CDR.WSE', 2) + bars('CDR.WSE', 7, 6)})
+    hour_panel = panel.Panel('security_stooq_1h', 'WSE', tmp_path)
+    hour_panel.update(hours, hours.keys(), tool.INTERVAL_1H)
+    hours['CDR.WSE'] = hours['CDR.WSE'][:2] + bars('CDR.WSE', 6, 5) + hours['CDR.WSE'][2:]
+    hour_panel.update(hours, hours.keys(), tool.INTERVAL_1H)
+    assert hour_panel['close'][:, 0].tolist() == [0.0, 1.0, 5.0, 6.0]
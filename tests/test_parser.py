@@ -0,0 +1,62 @@
+import numpy as np
+
+from src import parser, cache
+from src.tool import DateTime
+
+STOOQ_CONTENT = b'''<TICKER>,<PER>,<DATE>,<TIME>,<OPEN>,<HIGH>,<LOW>,<CLOSE>,<VOL>,<OPENINT>
+KGHM,D,20200131,000000,90.0,93.0,89.5,92.0,400000,0
+KGHM,D,20200230,000000,91.0,93.5,90.0,92.6,484464,0
+KGHM,D,20200203,000000,91.0,93.5,90.0,,484464,0
+KGHM,D,20200204,000000,93.0,97.0,92.5,96.44,708829,0
+'''
+
+YAHOO_CONTENT = b'''Date,Open,High,Low,Close,Adj Close,Volume
+2020-01-31,90.0,93.0,89.5,92.0,91.0,400000
+2020-02-03,null,null,null,null,null,null
+2020-02-3x,91.0,93.5,90.0,92.6,92.6,484464
+2020-02-04,93.0,97.0,92.5,96.44,96.0,708829
+'''
+
+
+def test_timestamps_from_days():
+    days = np.array([19700101, 20200229, 20210229, 20201301, 20201200, 20201231])
+    timestamps, valid = parser.timestamps_from_days(days)
+    assert valid.tolist() == [True, True, False, False, False, True]
+    assert timestamps[valid].tolist() == [DateTime(1970, 1, 1).to_timestamp(),
+                                          DateTime(2020, 2, 29).to_timestamp(),
+                                          DateTime(2020, 12, 31).to_timestamp()]
+
+
+def test_parse_ohlc():
+    for content, columns, date_format in ((STOOQ_CONTENT, parser.STOOQ_COLUMNS, parser.STOOQ_DATE_FORMAT),
+                                          (YAHOO_CONTENT, parser.YAHOO_COLUMNS, parser.YAHOO_DATE_FORMAT)):
+        result, malformed = parser.parse_ohlc(content, columns, date_format)
+        assert result.dtype == cache.BAR_DTYPE
+        assert malformed == [3, 4]
+        assert [(DateTime.from_timestamp(r['timestamp']).format(), r['close'], r['volume']) for r in result] == [
+            ('2020-01-31 00:00:00', 92.0, 400000),
+            ('2020-02-04 00:00:00', 96.44, 708829)
+        ]
+
+    lines = STOOQ_CONTENT.split(b'\n')
+    content = b'\n'.join(lines[:2] + [b''] + lines[2:])
+    _, malformed = parser.parse_ohlc(content, parser.STOOQ_COLUMNS, parser.STOOQ_DATE_FORMAT)
+    assert malformed == [3, 4, 5]
+
+    result, malformed = parser.parse_ohlc(b'', parser.STOOQ_COLUMNS, parser.STOOQ_DATE_FORMAT)
+    assert len(result) == 0 and malformed == []
+
+    result, malformed = parser.parse_ohlc(b'<html>\n<body>consent</body>\n</html>',
+                                          parser.YAHOO_COLUMNS, parser.YAHOO_DATE_FORMAT)
+    assert len(result) == 0 and result.dtype == cache.BAR_DTYPE
+    assert malformed == [1, 2, 3]
+
+
+def test_to_series():
+    result, _ = parser.parse_ohlc(STOOQ_CONTENT, parser.STOOQ_COLUMNS, parser.STOOQ_DATE_FORMAT)
+    series = parser.to_series('KGH.WSE', result)
+    assert [(s.symbol, s.open, s.close, s.low, s.high, s.volume, s.low_score) for s in series] == [
+        ('KGH.WSE', 90.0, 92.0, 89.5, 93.0, 400000, 0),
+        ('KGH.WSE', 93.0, 96.44, 92.5, 97.0, 708829, 0)
+    ]
+    assert type(series[0].timestamp) is int and type(series[0].volume) is int
@@ -1,4 +1,9 @@
+import time
+
+import pytest
+
 from src import flow
+from src.clazz import Clazz
 
 
 def test_progress():
@@ -21,3 +26,102 @@ def test_exception(caplog):
             raise Exception('broken iteration of list')
     except:
         assert '0.0% 1st' in caplog.text
+
+
+def test_map_ordered():
+    def square(i: int) -> int:
+        time.sleep(0.001 * (i % 3))
+        return i * i
+
+    items = list(range(50))
+    assert list(flow.map_ordered(square, items, 1)) == [i * i for i in items]
+    assert list(flow.map_ordered(square, items, 4)) == [i * i for i in items]
+
+
+def test_map_ordered_failure():
+    called = []
+
+    def fail(i: int) -> int:
+        called.append(i)
+        if i == 3:
+            raise ValueError(i)
+        return i
+
+    with pytest.raises(ValueError):
+        list(flow.map_ordered(fail, range(1000), 4))
+    assert len(called) < 1000  # calls queued behind the failure are cancelled
+
+
+def test_rate_limiter():
+    limiter = flow.RateLimiter(rate=100.0, burst=5)
+    start = time.monotonic()
+    for _ in range(15):
+        with limiter:
+            pass
+    assert 0.09 < time.monotonic() - start < 0.5  # the burst passes at once, the rest at the rate
+
+
+def test_rate_limiter_in_flight():
+    limiter = flow.RateLimiter(rate=0.0, in_flight=2)
+    running, peak = [], []
+
+    def call(i: int) -> int:
+        with limiter:
+            running.append(i)
+            peak.append(len(running))
+            time.sleep(0.01)
+            running.remove(i)
+        return i
+
+    assert list(flow.map_ordered(call, range(20), 8)) == list(range(20))
+    assert max(peak) == 2
+
+
+def test_circuit_breaker():
+    breaker = flow.CircuitBreaker('test', 2, 0.1)
+    breaker.check()
+    breaker.fail()
+    breaker.check()
+    breaker.fail()
+    with pytest.raises(flow.CircuitOpenError):
+        breaker.check()
+    time.sleep(0.1)
+    breaker.check()  # the half-open trial
+    with pytest.raises(flow.CircuitOpenError):
+        breaker.check()
+    breaker.succeed()
+    breaker.check()
+
+
+def test_run_graph():
+    calls = []
+    active = []
+
+    def node(name: str, fail: bool = False):
+        def function():
+            active.append(name)
+            assert sum(1 for a in active if a.startswith('update')) <= 1
+            time.sleep(0.02)
+            calls.append(name)
+            active.remove(name)
+            if fail:
+                raise RuntimeError(name)
+
+        return function
+
+    nodes = {
+        'exchange': Clazz(function=node('exchange'), after=[]),
+        'verify-1': Clazz(function=node('verify-1'), after=['update-1']),
+        'update-1': Clazz(function=node('update-1'), after=['exchange'], group='engine'),
+        'update-2': Clazz(function=node('update-2', fail=True), after=['exchange'], group='engine'),
+        'analyse-2': Clazz(function=node('analyse-2'), after=['verify-2']),
+        'verify-2': Clazz(function=node('verify-2'), after=['update-2']),
+    }
+    states = flow.run_graph(nodes, 4, {'engine': 1})
+    assert states == {'exchange': 'done', 'update-1': 'done', 'verify-1': 'done',
+                      'update-2': 'failed', 'verify-2': 'skipped', 'analyse-2': 'skipped'}
+    assert calls[0] == 'exchange' and calls.index('update-1') < calls.index('verify-1')
+
+    with pytest.raises(ValueError):
+        flow.run_graph({'a': Clazz(function=node('a'), after=['b']),
+                        'b': Clazz(function=node('b'), after=['a'])}, 2)
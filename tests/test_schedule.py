@@ -1,6 +1,6 @@
 import orjson as json
 
-from src import schedule
+from src import schedule, stooq, config
 
 
 def test_scheduled_tasks():
@@ -11,3 +11,13 @@ def test_scheduled_tasks():
         for t in reply['tasks']:
             assert schedule.task_daily.__name__ == t['function']
             assert not t['next_run']
+
+
+def test_daily_graph():
+    nodes = schedule.daily_graph((stooq,), resume=True)
+    assert len(nodes) == 1 + 4 * len(config.EXCHANGES)
+    assert nodes['stooq-WSE-analyse'].after == ['stooq-WSE-verify']
+    assert nodes['stooq-WSE-update'].group == 'stooq'
+    assert nodes['stooq-WSE-update'].function.args == (stooq, ['WSE'])
+    assert nodes['stooq-WSE-update'].function.keywords == {'resume': True}
+    assert 'resume' not in nodes['stooq-WSE-panel'].function.keywords
@@ -1,7 +1,11 @@
+import threading
 from datetime import datetime, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
 from typing import List, Any
 
-from src import tool, exante, yahoo, stooq
+import pytest
+
+from src import tool, exante, yahoo, stooq, session, flow
 from src.tool import DateTime
 
 
@@ -49,3 +53,54 @@ def test_session():
 
         assert accept_volume(d_exante['volume'], d_yahoo['volume'])
         assert accept_volume(d_yahoo['volume'], d_stooq['volume'])
+
+
+class FlakyHandler(BaseHTTPRequestHandler):
+    """Local stand-in of a provider replying with the statuses in order"""
+    statuses = []
+    posts = 0
+
+    def do_POST(self):
+        FlakyHandler.posts += 1
+        self.do_GET()
+
+    def do_GET(self):
+        status = self.statuses.pop(0) if self.statuses else 200
+        self.send_response(status)
+        if status == 429:
+            self.send_header('Retry-After', '0')
+        self.send_header('Content-Length', '0')
+        self.end_headers()
+
+    def log_message(self, *args):
+        pass
+
+
+def test_request_retry(monkeypatch):
+    monkeypatch.setattr(session.config, 'rate_limit', lambda provider: (0.0, 1, 8))
+    monkeypatch.setattr(session, 'RETRY_BACKOFF', 0.01)
+    monkeypatch.setattr(session, 'LIMITERS', {})
+    monkeypatch.setattr(session, 'BREAKERS', {})
+    server = ThreadingHTTPServer(('127.0.0.1', 0), FlakyHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    url = f'http://127.0.0.1:{server.server_port}/'
+    try:
+        with session.Session() as http:
+            FlakyHandler.statuses = [503, 429, 502]
+            assert http.get(url).status_code == 200
+            FlakyHandler.statuses = [404]
+            assert http.get(url).status_code == 404
+            FlakyHandler.statuses = [500] * session.BREAKER_THRESHOLD
+            while FlakyHandler.statuses:
+                assert http.get(url).status_code == 500
+            assert http.breaker.failures == session.BREAKER_THRESHOLD
+            with pytest.raises(flow.CircuitOpenError):
+                http.get(url)
+
+        with session.Session() as http:
+            http.breaker.succeed()
+            FlakyHandler.statuses = [503]
+            assert http.post(url).status_code == 503
+            assert FlakyHandler.posts == 1  # the order might have been placed already
+    finally:
+        server.shutdown()
@@ -1,3 +1,8 @@
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import requests
+
 from src import stooq, tool
 from src.tool import DateTime
 
@@ -23,3 +28,93 @@ def test_securities():
     with stooq.SecuritySeries(interval) as security_series:
         time_series = security_series[symbol]
     assert len(time_series) >= 1000
+
+
+CONTENT = b'''<TICKER>,<PER>,<DATE>,<TIME>,<OPEN>,<HIGH>,<LOW>,<CLOSE>,<VOL>,<OPENINT>
+KGHM,D,20200131,000000,90.0,93.0,89.5,92.0,400000,0
+KGHM,D,20200203,000000,91.0,93.5,90.0,92.6,484464,0
+KGHM,D,2020020x,000000,91.0,93.5,90.0,92.6,484464,0
+KGHM,D,20200204,000000,93.0,97.0,92.5,96.44,708829,0
+'''
+
+
+def test_zip_index():
+    name_list = ['data/daily/us/nyse stocks/2/xom.us.txt',
+                 'data/daily/us/nyse stocks/1/xom.us.txt',
+                 'data/daily/us/nyse stocks/1/brk-b.us.txt',
+                 'data/daily/us/nasdaq stocks/1/aapl.us.txt']
+    index = stooq.zip_index(name_list, tool.INTERVAL_1D, 'NYSE')
+    assert index == {'xom': 'data/daily/us/nyse stocks/1/xom.us.txt',
+                     'brk-b': 'data/daily/us/nyse stocks/1/brk-b.us.txt'}
+    assert stooq.stooq_symbol('BRK.B') == 'brk-b'
+
+
+def test_series_from_stooq():
+    ts_from = DateTime(2020, 2, 2).to_timestamp()
+    ts_to = DateTime(2020, 2, 4).to_timestamp()
+    series = stooq.series_from_stooq(CONTENT, 'KGH.WSE', ts_from, ts_to)
+    closing_prices = [(DateTime.from_timestamp(s.timestamp).format(), s.close, s.volume) for s in series]
+    assert closing_prices == [
+        ('2020-02-03 00:00:00', 92.6, 484464),
+        ('2020-02-04 00:00:00', 96.44, 708829)
+    ]
+    assert series[0].low_score == 0 and series[0].symbol == 'KGH.WSE'
+    columns, malformed = stooq.parse_member((CONTENT, ts_from, ts_to))
+    assert columns['timestamp'].tolist() == [s.timestamp for s in series]
+    assert malformed == [4]
+
+
+ZIP_CONTENT = bytes(range(256)) * 4096
+ZIP_ETAG = '"v1"'
+
+
+class ZipHandler(BaseHTTPRequestHandler):
+    """Local stand-in of the stooq server supporting conditional and range requests"""
+    requests = []
+
+    def do_GET(self):
+        content = ZIP_CONTENT
+        status = 200
+        if self.headers.get('If-None-Match') == ZIP_ETAG:
+            status = 304
+        elif self.headers.get('Range') and self.headers.get('If-Range') == ZIP_ETAG:
+            status = 206
+            content = content[int(self.headers['Range'][len('bytes='):-1]):]
+        self.requests.append((self.headers.get('Range'), status))
+        self.send_response(status)
+        self.send_header('ETag', ZIP_ETAG)
+        if status != 304:
+            self.send_header('Content-Length', str(len(content)))
+        self.end_headers()
+        if status != 304:
+            self.wfile.write(content)
+
+    def log_message(self, *args):
+        pass
+
+
+def test_download_zip(tmp_path, monkeypatch):
+    monkeypatch.setattr(stooq, 'STOOQ_PATH', tmp_path)
+    zip_path = tmp_path.joinpath('data-daily-pl.zip')
+    server = ThreadingHTTPServer(('127.0.0.1', 0), ZipHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    url = f'http://127.0.0.1:{server.server_port}/d_pl_txt.zip'
+    try:
+        with requests.Session() as http:
+            assert stooq.download_zip(http, url, zip_path)
+            assert zip_path.read_bytes() == ZIP_CONTENT
+            assert stooq.load_manifest()[zip_path.name]['sha256'] == stooq.file_checksum(zip_path)
+
+            # not modified since the last download
+            assert not stooq.download_zip(http, url, zip_path)
+
+            # resumed from the pending file of an interrupted download
+            zip_path.unlink()
+            zip_path.with_suffix('.pending').write_bytes(ZIP_CONTENT[:1000])
+            stooq.update_manifest(zip_path.name, pending={'etag': ZIP_ETAG})
+            assert stooq.download_zip(http, url, zip_path)
+            assert zip_path.read_bytes() == ZIP_CONTENT
+            assert not zip_path.with_suffix('.pending').exists()
+    finally:
+        server.shutdown()
+    assert ZipHandler.requests == [(None, 200), (None, 304), ('bytes=1000-', 206)]
@@ -1,4 +1,6 @@
-from src import store
+from src import store, yahoo, tool, schema, cache
+from src.clazz import Bar
+from src.tool import DateTime
 
 
 def test_editable():
@@ -19,3 +21,89 @@ def test_editable():
         pass
     else:
         assert False
+
+
+def test_merge(tmp_path, monkeypatch):
+    monkeypatch.setattr(store.config, 'STORE_PATH', tmp_path)
+    with store.File('test_info', editable=True) as info:
+        info['WSE'] = {'KGH': 1}
+        info['NYSE'] = {'XOM': 1}
+
+    with store.File('test_info', editable=True) as wse_info:
+        with store.File('test_info', editable=True) as nyse_info:
+            nyse_info['NYSE'] = {'XOM': 2}
+        wse_info['WSE'] = {'KGH': 2}
+
+    with store.File('test_info') as info:
+        assert info == {'WSE': {'KGH': 2}, 'NYSE': {'XOM': 2}}
+
+
+def test_flush(tmp_path, monkeypatch):
+    monkeypatch.setattr(store.config, 'STORE_PATH', tmp_path)
+    with store.File('test_info', editable=True) as wse_info:
+        wse_info['KGH'] = 1
+        wse_info.flush()
+        with store.File('test_info') as info:
+            assert info == {'KGH': 1}
+
+        with store.File('test_info', editable=True) as nyse_info:
+            nyse_info['XOM'] = 1
+        wse_info['KGH'] = 2
+        wse_info.flush()
+        assert wse_info == {'KGH': 2, 'XOM': 1}
+
+    with store.File('test_info') as info:
+        assert info == {'KGH': 2, 'XOM': 1}
+
+
+def test_checkpoint(tmp_path, monkeypatch):
+    monkeypatch.setattr(store.config, 'STORE_PATH', tmp_path)
+    session = DateTime(2020, 1, 3)
+    checkpoint = store.Checkpoint('stooq_1d', 'analyse', 'WSE', session, resume=True)
+    assert 'KGH.WSE' not in checkpoint
+    checkpoint += ['KGH.WSE', 'PKN.WSE']
+
+    assert 'KGH.WSE' in store.Checkpoint('stooq_1d', 'analyse', 'WSE', session, resume=True)
+    assert 'KGH.WSE' not in store.Checkpoint('stooq_1d', 'analyse', 'WSE', session, resume=False)
+    assert 'KGH.WSE' not in store.Checkpoint('stooq_1d', 'analyse', 'WSE', DateTime(2020, 1, 7), resume=True)
+    assert 'KGH.WSE' not in store.Checkpoint('stooq_1d', 'verify', 'WSE', session, resume=True)
+
+
+def test_bulk():
+    symbols = ['XOM.NYSE', 'AAPL.NASDAQ']
+    with yahoo.SecuritySeries(tool.INTERVAL_1D) as security_series:
+        series = dict(security_series.bulk(symbols, batch_size=100))
+        assert sorted(series) == sorted(symbols)
+        for symbol in symbols:
+            assert series[symbol] == security_series[symbol]
+
+
+def test_insert_many():
+    db = store.db_connect()
+    name = 'test_insert_many'
+    store.create_collection(db, name, store.SECURITY_UNIQUE_FIELDS, schema.SECURITY_SCHEMA)
+    try:
+        ts = DateTime(2020, 1, 31).to_timestamp()
+        analysed = Bar.security('KGH.WSE', ts, 90.0, 92.0, 89.5, 93.0, 400000).to_dict()
+        analysed['low_score'] = 5
+        assert store.insert_many(db, name, [analysed], store.SECURITY_UNIQUE_FIELDS, store.OVERWRITE_CONFLICT)
+
+        fetched = Bar.security('KGH.WSE', ts, 90.0, 92.5, 89.5, 93.0, 400000).to_dict()
+        invalid = dict(fetched, timestamp=DateTime(2020, 2, 3).to_timestamp(), volume='none')
+        result = store.insert_many(db, name, [fetched, invalid], store.SECURITY_UNIQUE_FIELDS,
+                                   store.OVERWRITE_UPDATE, cache.BAR_DTYPE.names)
+        assert result[0] == fetched and isinstance(result[1], store.DocumentError)
+        stored = next(db.collection(name).find({'symbol': 'KGH.WSE', 'timestamp': ts}))
+        assert stored['close'] == 92.5 and stored['low_score'] == 5
+
+        result = store.insert_many(db, name, [fetched], store.SECURITY_UNIQUE_FIELDS, store.OVERWRITE_IGNORE)
+        assert result == [None]
+    finally:
+        store.delete_collection(db, name)
+
+
+def test_pooled_http_client():
+    session = store.PooledHTTPClient(16).create_session('http://localhost:8529')
+    adapter = session.get_adapter('http://localhost:8529')
+    assert adapter._pool_maxsize == 16
+    assert adapter.max_retries.total == 3 and 503 in adapter.max_retries.status_forcelist
@@ -1,4 +1,7 @@
+import random
+
 import orjson as json
+import pytest
 
 from src import swings, config
 from src.clazz import Clazz
@@ -37,3 +40,63 @@ def test_reduce_4():
     reduced = swings.init(security)
     reduced = swings.reduce(reduced, score)
     assert len(reduced) == 68
+
+
+def reduce_all(series):
+    reduced = swings.init(series)
+    for score in range(1, 8):
+        reduced = swings.reduce(reduced, score)
+
+
+def random_series(size: int):
+    close = 100.0
+    series = []
+    for i in range(size):
+        open_value = close
+        close = round(close * random.uniform(0.9, 1.1), random.choice([0, 2]))
+        low, high = min(open_value, close), max(open_value, close)
+        if random.random() < 0.1:
+            low = high = close = open_value
+        series += [Clazz(timestamp=i, open=open_value, close=close, low=low, high=high)]
+    return series
+
+
+@pytest.mark.parametrize('jit', [False, True])
+def test_calculate(jit):
+    random.seed(0)
+    for size in [0, 1, 2, 3, 10, 100, 1000]:
+        for _ in range(10):
+            series1 = random_series(size)
+            series2 = [Clazz(s) for s in series1]
+            reduce_all(series1)
+            swings.calculate(series2, jit=jit)
+            assert series1 == series2
+
+
+def test_calculate_sample():
+    with config.TESTS_PATH.joinpath('sample.json').open() as sample_io:
+        sample = json.loads(sample_io.read())
+        series1 = [Clazz(s) for s in sample['KGH.WSE']]
+        series2 = [Clazz(s) for s in sample['KGH.WSE']]
+
+    reduce_all(series1)
+    swings.calculate(series2)
+    assert series1 == series2
+
+
+@pytest.mark.parametrize('jit', [False, True])
+def test_calculate_incremental(jit):
+    random.seed(1)
+    for size in [2, 3, 10, 100, 1000]:
+        for _ in range(10):
+            series1 = random_series(size)
+            series2 = [Clazz(s) for s in series1]
+            swings.calculate(series1, jit=False)
+
+            split = random.randint(1, size)
+            state = swings.calculate(series2[:split], jit=jit)
+            state = Clazz(json.loads(json.dumps(state)))
+            ts_from = swings.state_from(state)
+            window = [s for s in series2 if s.timestamp >= ts_from]
+            swings.calculate(window, state, jit=jit)
+            assert series1 == series2